@@ -0,0 +1,229 @@
+import threading
+from array import array
+from bisect import bisect_left
+from functools import reduce
+
+from path_model import URIInterner
+from sparql_errors import SPARQLTimeoutError
+from sparql_results import iter_result_rows
+from config import (
+    DEFAULT_EXPLORER_RESULT_FORMAT,
+    DEFAULT_ADJACENCY_MAX_ENTITY_ROWS,
+    DEFAULT_ADJACENCY_BATCH_ROWS,
+    DEFAULT_ADJACENCY_BATCH_ENTITIES,
+)
+
+ADJACENCY_PATTERNS = {
+    "out": "?entity ?edge ?neighbour .",
+    "in": "?neighbour ?edge ?entity .",
+}
+
+
+def intersect_sorted(left, right):
+    if len(left) > len(right):
+        left, right = right, left
+    if len(left) * 8 < len(right):
+        # Binary search the few values of the short array in the long one.
+        common = array("q")
+        position = 0
+        for value in left:
+            position = bisect_left(right, value, position)
+            if position == len(right):
+                break
+            if right[position] == value:
+                common.append(value)
+        return common
+    return array("q", sorted(set(left).intersection(right)))
+
+
+class AdjacencyCache:
+    def __init__(
+        self,
+        sparql_wrapper,
+        edge_filter,
+        result_format=DEFAULT_EXPLORER_RESULT_FORMAT,
+        max_entity_rows=DEFAULT_ADJACENCY_MAX_ENTITY_ROWS,
+        batch_rows=DEFAULT_ADJACENCY_BATCH_ROWS,
+        batch_entities=DEFAULT_ADJACENCY_BATCH_ENTITIES,
+        excluded_edge_pattern=None,
+    ):
+        self.sparql = sparql_wrapper
+        self.edge_filter = edge_filter
+        self.result_format = result_format
+        self.max_entity_rows = max_entity_rows
+        self.batch_rows = batch_rows
+        self.batch_entities = batch_entities
+        # Compiled pattern of edges dropped on the client, for explorers that do
+        # not filter edges on the endpoint.
+        self.excluded_edge_pattern = excluded_edge_pattern
+        self.interner = URIInterner()
+        # direction -> entity id -> {edge id: sorted array of neighbour ids}.
+        # None marks entities with too many adjacent triples to keep locally.
+        self._adjacency = {"out": {}, "in": {}}
+        self._pending = {"out": {}, "in": {}}
+        self._lock = threading.Lock()
+        self.adjacency_queries = 0
+        self.local_lookups = 0
+        self.server_fallbacks = 0
+
+    def _adjacency_query(self, entities, direction, count=False):
+        values = " ".join("<" + entity + ">" for entity in entities)
+        select = "?entity (COUNT(*) AS ?count)" if count else "?entity ?edge ?neighbour"
+        return f"""SELECT {select}
+                WHERE {{
+                    VALUES ?entity {{ {values} }}
+                    {ADJACENCY_PATTERNS[direction]}
+                    FILTER (isURI(?neighbour) && {self.edge_filter})
+                }}{" GROUP BY ?entity" if count else ""}"""
+
+    def _run(self, QUERY, variables):
+        with self._lock:
+            self.adjacency_queries += 1
+        return list(iter_result_rows(self.sparql, QUERY, variables, self.result_format))
+
+    def _count_adjacent_triples(self, entities, direction):
+        counts = {}
+        for start in range(0, len(entities), self.batch_entities):
+            batch = entities[start : start + self.batch_entities]
+            QUERY = self._adjacency_query(batch, direction, count=True)
+            try:
+                rows = self._run(QUERY, ("entity", "count"))
+            except SPARQLTimeoutError:
+                counts.update(dict.fromkeys(batch))
+                continue
+            counts.update(dict.fromkeys(batch, 0))
+            counts.update((entity, int(count)) for entity, count in rows)
+        return counts
+
+    def _fetch_batch(self, entities, direction):
+        QUERY = self._adjacency_query(entities, direction)
+        try:
+            rows = self._run(QUERY, ("entity", "edge", "neighbour"))
+        except SPARQLTimeoutError:
+            return dict.fromkeys(entities)
+        intern = self.interner.intern
+        neighbours = {entity: {} for entity in entities}
+        for entity, edge, neighbour in rows:
+            if self.excluded_edge_pattern and self.excluded_edge_pattern.search(edge):
+                continue
+            neighbours.setdefault(entity, {}).setdefault(intern(edge), set()).add(
+                intern(neighbour)
+            )
+        return {
+            entity: {
+                edge_id: array("q", sorted(neighbour_ids))
+                for edge_id, neighbour_ids in edges.items()
+            }
+            for entity, edges in neighbours.items()
+        }
+
+    def _fetch(self, entities, direction):
+        fetched = {}
+        batches = [[]]
+        batch_rows = 0
+        # Entities are packed into queries of about batch_rows result rows.
+        for entity, count in self._count_adjacent_triples(entities, direction).items():
+            if count is None or count > self.max_entity_rows:
+                fetched[entity] = None
+            elif count == 0:
+                fetched[entity] = {}
+            else:
+                if batches[-1] and batch_rows + count > self.batch_rows:
+                    batches.append([])
+                    batch_rows = 0
+                batches[-1].append(entity)
+                batch_rows += count
+        for batch in batches:
+            if batch:
+                fetched.update(self._fetch_batch(batch, direction))
+        with self._lock:
+            for entity, adjacency in fetched.items():
+                self._adjacency[direction][self.interner.intern(entity)] = adjacency
+
+    def get_adjacencies(self, entities, direction):
+        entity_ids = [
+            self.interner.intern(entity) for entity in dict.fromkeys(entities)
+        ]
+        known = self._adjacency[direction]
+        pending = self._pending[direction]
+        owned = []
+        waiting = []
+        # Entities already being fetched by another thread are waited for
+        # instead of being fetched twice.
+        with self._lock:
+            for entity_id in entity_ids:
+                if entity_id in known:
+                    continue
+                if entity_id in pending:
+                    waiting.append(pending[entity_id])
+                else:
+                    pending[entity_id] = threading.Event()
+                    owned.append(entity_id)
+        if owned:
+            try:
+                self._fetch(
+                    [self.interner.uri(entity_id) for entity_id in owned], direction
+                )
+            finally:
+                with self._lock:
+                    for entity_id in owned:
+                        pending.pop(entity_id).set()
+        for event in waiting:
+            event.wait()
+        # An entity is missing only if the thread that fetched it failed.
+        missing = [entity_id for entity_id in entity_ids if entity_id not in known]
+        if missing:
+            self._fetch(
+                [self.interner.uri(entity_id) for entity_id in missing], direction
+            )
+        return [known[entity_id] for entity_id in entity_ids]
+
+    def neighbour_rows(self, kind, entities, resolved_edges=None):
+        if not entities:
+            return []
+        direction = "in" if kind == "right_resolved" else "out"
+        adjacencies = self.get_adjacencies(entities, direction)
+        with self._lock:
+            if any(adjacency is None for adjacency in adjacencies):
+                self.server_fallbacks += 1
+                return None
+            self.local_lookups += 1
+
+        uri = self.interner.uri
+        smallest = min(adjacencies, key=len)
+        common_edges = set(smallest)
+        for adjacency in adjacencies:
+            if adjacency is not smallest:
+                common_edges.intersection_update(adjacency)
+
+        rows = []
+        if kind == "left_expandable":
+            excluded_edges = {
+                self.interner.lookup(edge) for edge in resolved_edges or ()
+            }
+            for edge_id in common_edges - excluded_edges:
+                edge = uri(edge_id)
+                for entity, adjacency in zip(dict.fromkeys(entities), adjacencies):
+                    rows.extend(
+                        (entity, edge, uri(neighbour_id))
+                        for neighbour_id in adjacency[edge_id]
+                    )
+            return rows
+
+        for edge_id in common_edges:
+            neighbour_ids = reduce(
+                intersect_sorted,
+                sorted((adjacency[edge_id] for adjacency in adjacencies), key=len),
+            )
+            edge = uri(edge_id)
+            rows.extend((uri(neighbour_id), edge) for neighbour_id in neighbour_ids)
+        return rows
+
+    def stats(self):
+        return {
+            "entities": len(self._adjacency["out"]) + len(self._adjacency["in"]),
+            "uris": len(self.interner),
+            "adjacency_queries": self.adjacency_queries,
+            "local_lookups": self.local_lookups,
+            "server_fallbacks": self.server_fallbacks,
+        }
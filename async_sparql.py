@@ -0,0 +1,88 @@
+import asyncio
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from sparql_errors import SPARQLTimeoutError
+from config import DEFAULT_ASYNC_MAX_CONCURRENCY, DEFAULT_TIMEOUT
+
+
+class AsyncSPARQLClient:
+    def __init__(
+        self,
+        sparql_wrapper,
+        max_concurrency=DEFAULT_ASYNC_MAX_CONCURRENCY,
+        request_timeout=DEFAULT_TIMEOUT,
+    ):
+        self.sparql = sparql_wrapper
+        self.max_concurrency = max_concurrency
+        self.request_timeout = request_timeout
+        # Every worker thread keeps its own keep-alive connection in the
+        # wrapper's pooled transport, and all of them share its caches.
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="sparql-async"
+        )
+        # asyncio.Semaphore is bound to the loop it is first used in, and
+        # every run_queries call runs its own loop.
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._inflight_queries = {}
+        self.coalesced_requests = 0
+
+    def _get_semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def arun_query(self, QUERY, timeout=None):
+        cache_key = self.sparql.cache_key(QUERY)
+        cached_results = self.sparql.get_cached_results(QUERY, cache_key)
+        if cached_results is not None:
+            return cached_results
+
+        inflight_query = self._inflight_queries.get(cache_key)
+        if inflight_query is None:
+            inflight_query = asyncio.ensure_future(self._execute_query(QUERY))
+            self._inflight_queries[cache_key] = inflight_query
+            inflight_query.add_done_callback(
+                lambda _: self._inflight_queries.pop(cache_key, None)
+            )
+        else:
+            self.coalesced_requests += 1
+            self.sparql.async_coalesced_requests += 1
+
+        timeout = self.request_timeout if timeout is None else timeout
+        # Shielded so that one caller timing out does not cancel the request
+        # for the other callers waiting on it.
+        try:
+            return await asyncio.wait_for(asyncio.shield(inflight_query), timeout)
+        except asyncio.TimeoutError as e:
+            raise SPARQLTimeoutError(
+                f"No response within {timeout}s for query: {QUERY[:200]}"
+            ) from e
+
+    async def _execute_query(self, QUERY):
+        loop = asyncio.get_running_loop()
+        async with self._get_semaphore():
+            return await loop.run_in_executor(
+                self._executor, self.sparql.run_query, QUERY
+            )
+
+    async def arun_queries(self, queries, timeout=None, return_exceptions=False):
+        return await asyncio.gather(
+            *(self.arun_query(query, timeout) for query in queries),
+            return_exceptions=return_exceptions,
+        )
+
+    def run_queries(self, queries, timeout=None, return_exceptions=False):
+        return asyncio.run(self.arun_queries(queries, timeout, return_exceptions))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,66 @@
+# Compares the endpoint time per neighbour query for the GraphExplorer edge
+# filter modes. Run from the repository root:
+#   python -m benchmarks.edge_filter_benchmark --repeat 3
+import argparse
+import time
+
+from sparql_wrapper import SPARQLWrapperCache
+from graph_explorer import GraphExplorer
+from config import (
+    DEFAULT_SPARQL_ENDPOINT,
+    DEFAULT_GRAPH,
+    DEFAULT_TIMEOUT,
+    DEFAULT_FILTER_PATTERN,
+)
+
+DEFAULT_SEED_SETS = [
+    ["http://dbpedia.org/resource/Budapest", "http://dbpedia.org/resource/Szeged"],
+    ["http://dbpedia.org/resource/Albert_Einstein"],
+    [
+        "http://dbpedia.org/resource/Danube",
+        "http://dbpedia.org/resource/Tisza",
+        "http://dbpedia.org/resource/Rhine",
+    ],
+]
+
+
+def benchmark_edge_filter_mode(mode, endpoint, graph, seed_sets, repeat):
+    # Result caching is disabled so that every query reaches the endpoint.
+    sparql = SPARQLWrapperCache(
+        endpoint, graph, DEFAULT_TIMEOUT, memory_cache_max_bytes=0
+    )
+    explorer = GraphExplorer(
+        sparql,
+        DEFAULT_FILTER_PATTERN,
+        max_entities_in_path_node=5,
+        max_workers=1,
+        edge_filter_mode=mode,
+    )
+    # Resolving the predicate index is a one-off cost and not measured.
+    explorer._build_edge_filter_sparql()
+    requests_before = sparql.transport.requests_sent
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        for seeds in seed_sets:
+            explorer.get_right_neighbours_of_entities(seeds)
+            explorer.get_left_neighbours_of_entities(seeds)
+    elapsed = time.perf_counter() - start_time
+    requests = sparql.transport.requests_sent - requests_before
+    return elapsed, requests
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Edge filter mode benchmark")
+    parser.add_argument("--endpoint", default=DEFAULT_SPARQL_ENDPOINT)
+    parser.add_argument("--graph", default=DEFAULT_GRAPH)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", default=["regex", "index", "client"])
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'requests':>8} {'total s':>9} {'s/request':>10}")
+    for mode in args.modes:
+        elapsed, requests = benchmark_edge_filter_mode(
+            mode, args.endpoint, args.graph, DEFAULT_SEED_SETS, args.repeat
+        )
+        per_request = elapsed / requests if requests else 0.0
+        print(f"{mode:<8} {requests:>8} {elapsed:>9.2f} {per_request:>10.3f}")
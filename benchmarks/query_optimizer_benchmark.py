@@ -0,0 +1,87 @@
+# Compares the endpoint time of generated expansion queries with and without
+# the QueryOptimizer pass. Run from the repository root:
+#   python -m benchmarks.query_optimizer_benchmark --repeat 3
+import argparse
+import time
+
+from sparql_wrapper import SPARQLWrapperCache
+from set_extension import CompositeGraphBasedSetExtension
+from query_optimizer import PredicateStatistics, QueryOptimizer
+from config import (
+    DEFAULT_SPARQL_ENDPOINT,
+    DEFAULT_GRAPH,
+    DEFAULT_TIMEOUT,
+    DEFAULT_FILTER_PATTERN,
+)
+
+DEFAULT_SEED_SETS = [
+    ["http://dbpedia.org/resource/Budapest", "http://dbpedia.org/resource/Szeged"],
+    [
+        "http://dbpedia.org/resource/Danube",
+        "http://dbpedia.org/resource/Tisza",
+        "http://dbpedia.org/resource/Rhine",
+    ],
+    [
+        "http://dbpedia.org/resource/Albert_Einstein",
+        "http://dbpedia.org/resource/Niels_Bohr",
+    ],
+]
+
+
+def create_model(sparql, query_optimizer=None):
+    return CompositeGraphBasedSetExtension(
+        sparql,
+        path_length=3,
+        right_extensions=1,
+        filter_pattern=DEFAULT_FILTER_PATTERN,
+        min_entities_for_values_clause=2,
+        max_entities_in_path_node=5,
+        optimize_queries=query_optimizer is not None,
+        query_optimizer=query_optimizer,
+    )
+
+
+def time_query(sparql, QUERY, repeat):
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        results = sparql.run_query(QUERY)
+    return (time.perf_counter() - start_time) / repeat, len(results)
+
+
+def benchmark_query_optimizer(endpoint, graph, seed_sets, repeat):
+    # Exploration and predicate statistics are one-off costs and not measured;
+    # the expansion queries run with result caching disabled.
+    explorer_sparql = SPARQLWrapperCache(endpoint, graph, DEFAULT_TIMEOUT)
+    query_sparql = SPARQLWrapperCache(
+        endpoint, graph, DEFAULT_TIMEOUT, memory_cache_max_bytes=0
+    )
+    query_optimizer = QueryOptimizer(PredicateStatistics(explorer_sparql))
+    baseline_model = create_model(explorer_sparql)
+    optimized_model = create_model(explorer_sparql, query_optimizer)
+    rows = []
+    for seeds in seed_sets:
+        paths = baseline_model.get_expansion_paths(seeds)
+        if not paths:
+            continue
+        timings = []
+        for model in (baseline_model, optimized_model):
+            QUERY = model.build_query(seeds, paths)[0]
+            timings.append((len(QUERY),) + time_query(query_sparql, QUERY, repeat))
+        rows.append((seeds, timings))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query optimizer benchmark")
+    parser.add_argument("--endpoint", default=DEFAULT_SPARQL_ENDPOINT)
+    parser.add_argument("--graph", default=DEFAULT_GRAPH)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'seeds':<40} {'query':>8} {'chars':>6} {'results':>8} {'s/query':>8}")
+    for seeds, timings in benchmark_query_optimizer(
+        args.endpoint, args.graph, DEFAULT_SEED_SETS, args.repeat
+    ):
+        label = ", ".join(seed.rsplit("/", 1)[-1] for seed in seeds)[:40]
+        for name, (length, elapsed, results) in zip(("baseline", "optimized"), timings):
+            print(f"{label:<40} {name:>8} {length:>6} {results:>8} {elapsed:>8.2f}")
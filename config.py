@@ -21,3 +21,125 @@ DEFAULT_MAX_OR_NUM = 5
 DEFAULT_OUTPUT_DIR = "output"
 DEFAULT_SAMPLE_SIZE_SEEDS = 5
 DEFAULT_MAX_QUERIES_PER_TEMPLATE = 10
+
+# Persistent SPARQL result cache (disabled when the path is None)
+DEFAULT_CACHE_PATH = None
+DEFAULT_CACHE_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_CACHE_MAX_ENTRIES = None
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024**3
+
+# In-memory SPARQL result cache (max_bytes None means unbounded)
+DEFAULT_MEMORY_CACHE_MAX_BYTES = 512 * 1024**2
+DEFAULT_MEMORY_CACHE_POLICY = "lru"
+
+# HTTP transport: queries whose GET URL would exceed this length are POSTed
+DEFAULT_MAX_GET_URL_LENGTH = 2048
+
+# Asynchronous SPARQL client
+DEFAULT_ASYNC_MAX_CONCURRENCY = 8
+
+# Result pagination; DBpedia returns at most 10000 rows per request
+DEFAULT_PAGE_SIZE = 10000
+DEFAULT_MIN_PAGE_SIZE = 500
+DEFAULT_MAX_PAGE_SIZE = 10000
+DEFAULT_TARGET_PAGE_SECONDS = 20
+DEFAULT_MAX_PAGE_BYTES = 32 * 1024**2
+DEFAULT_MAX_PARALLEL_PAGES = 4
+
+# Result format for GraphExplorer queries: "json", or the compact "tsv"/"csv"
+# formats that are streamed and parsed into plain tuples
+DEFAULT_EXPLORER_RESULT_FORMAT = "tsv"
+
+# Client policy for SPARQL endpoints: adaptive token-bucket rate limit, retries
+# with jittered exponential backoff and a circuit breaker. ENDPOINT_POLICIES
+# overrides the defaults per endpoint URL. Generated expansion queries longer
+# than max_query_length are split into sub-queries.
+DEFAULT_ENDPOINT_POLICY = {
+    "requests_per_second": 20.0,
+    "burst": 40,
+    "min_requests_per_second": 0.5,
+    "max_retries": 4,
+    "backoff_base": 1.0,
+    "backoff_max": 60.0,
+    "retry_timeouts": False,
+    "failure_threshold": 5,
+    "reset_timeout": 60.0,
+    "max_query_length": 7800,
+}
+ENDPOINT_POLICIES = {
+    DEFAULT_SPARQL_ENDPOINT: {"requests_per_second": 10.0, "burst": 20},
+}
+
+# Split GraphExplorer neighbour queries that time out into smaller sub-queries
+DEFAULT_SPLIT_ON_TIMEOUT = True
+
+# How GraphExplorer finds the neighbours shared by an entity set: "server" runs
+# an aggregation query per set, "adjacency" fetches each entity's adjacency once
+# and intersects the sets locally. Entities with more adjacent triples than
+# DEFAULT_ADJACENCY_MAX_ENTITY_ROWS are always left to the server.
+DEFAULT_EXPLORATION_MODE = "server"
+DEFAULT_ADJACENCY_MAX_ENTITY_ROWS = 20000
+DEFAULT_ADJACENCY_BATCH_ROWS = 10000
+DEFAULT_ADJACENCY_BATCH_ENTITIES = 50
+
+# Number of entity sets of a GraphExplorer depth level whose neighbour queries
+# run concurrently (1 explores sequentially)
+DEFAULT_EXPLORER_MAX_WORKERS = 4
+
+# Fetch the resolved and expandable neighbours of an entity set with a single
+# UNION query instead of one query per kind. Off by default: the combined query
+# cannot be split, so a large neighbourhood only falls back to the separate,
+# splittable queries after a full timeout
+DEFAULT_COMBINE_NEIGHBOUR_QUERIES = False
+
+# Count the distinct targets of each expandable edge first and only download
+# the edges that stay under max_entities_in_path_node
+DEFAULT_PREAGGREGATE_FANOUT = True
+
+# How GraphExplorer queries exclude the edges matched by the filter pattern:
+# "regex" runs the regex on the endpoint, "index" resolves the pattern once
+# against the endpoint's predicate vocabulary (cached in
+# DEFAULT_PREDICATE_INDEX_PATH) and tests ?edge against explicit IRIs, "client"
+# filters the fetched rows locally. "index" falls back to "regex" when both the
+# allowed and the excluded predicate lists exceed DEFAULT_PREDICATE_INDEX_MAX_TERMS.
+DEFAULT_EDGE_FILTER_MODE = "regex"
+DEFAULT_PREDICATE_INDEX_PATH = "predicate_index.json"
+DEFAULT_PREDICATE_INDEX_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_PREDICATE_INDEX_MAX_TERMS = 2000
+
+# GraphExplorer search: "breadth_first" explores every path up to path_length,
+# "best_first" expands the most selective entity sets first. Both stop early
+# and return the paths found so far once a budget (None = unlimited) runs out.
+DEFAULT_EXPLORATION_STRATEGY = "breadth_first"
+DEFAULT_EXPLORATION_MAX_QUERIES = None
+DEFAULT_EXPLORATION_MAX_SECONDS = None
+DEFAULT_EXPLORATION_MAX_PATHS = None
+
+# Directory of stored exploration paths per seed set and exploration config,
+# reused instead of exploring again (disabled when the directory is None)
+DEFAULT_ARTIFACT_DIR = None
+
+# Sub-queries of a split expansion query that run concurrently
+DEFAULT_SPLIT_QUERY_MAX_WORKERS = 4
+
+# Ranked expansion: number of best candidates returned, and the entities read
+# per path pattern before the pattern counts as truncated (its remaining
+# entities are then only bounded, not counted)
+DEFAULT_RANKED_TOP_K = 50
+DEFAULT_RANKED_MAX_ROWS_PER_PATTERN = 10000
+
+# Drop implied triple patterns from generated queries and order the rest most
+# selective first, using per-predicate counts cached in
+# DEFAULT_PREDICATE_STATISTICS_PATH
+DEFAULT_OPTIMIZE_QUERIES = False
+DEFAULT_PREDICATE_STATISTICS_PATH = "predicate_statistics.json"
+DEFAULT_PREDICATE_STATISTICS_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_PREDICATE_STATISTICS_BATCH = 20
+
+# Write IRIs in generated queries as prefixed names instead of full <...>
+# IRIs, which keeps queries shorter
+DEFAULT_USE_PREFIXED_NAMES = False
+# Write local names that need a SPARQL 1.1 backslash escape, e.g.
+# Mercury_\(planet\), as escaped prefixed names; off by default because
+# engines such as rdflib do not unescape them, so those IRIs stay full <...>
+DEFAULT_ESCAPE_LOCAL_NAMES = False
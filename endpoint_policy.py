@@ -0,0 +1,202 @@
+import random
+import threading
+import time
+
+from sparql_errors import (
+    SPARQLEndpointError,
+    SPARQLConnectionError,
+    SPARQLTimeoutError,
+    SPARQLRateLimitError,
+    SPARQLCircuitOpenError,
+)
+from config import DEFAULT_ENDPOINT_POLICY, ENDPOINT_POLICIES
+
+
+class AdaptiveTokenBucket:
+    # AIMD rate limit: the request rate halves whenever the endpoint throttles
+    # us and creeps back up by `rate_increase` per successful request.
+    def __init__(
+        self,
+        rate,
+        burst,
+        min_rate=0.1,
+        max_rate=None,
+        rate_increase=0.05,
+        throttle_factor=0.5,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else rate
+        self.rate_increase = rate_increase
+        self.throttle_factor = throttle_factor
+        self._tokens = burst
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._last_refill) * self.rate
+        )
+        self._last_refill = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+    def record_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.rate_increase)
+
+    def record_throttle(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.throttle_factor)
+            self._tokens = min(self._tokens, 0)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.times_opened = 0
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open":
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    raise SPARQLCircuitOpenError(
+                        f"Circuit open after {self._consecutive_failures} consecutive "
+                        f"failures; retrying the endpoint in {remaining:.0f}s"
+                    )
+                self.state = "half_open"
+            # Half-open: let a single trial request through.
+            if self._trial_in_progress:
+                raise SPARQLCircuitOpenError(
+                    "Circuit half-open; waiting for the trial request"
+                )
+            self._trial_in_progress = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._consecutive_failures = 0
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            self._trial_in_progress = False
+            if (
+                self.state == "half_open"
+                or self._consecutive_failures >= self.failure_threshold
+            ):
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class EndpointPolicy:
+    def __init__(
+        self,
+        requests_per_second=DEFAULT_ENDPOINT_POLICY["requests_per_second"],
+        burst=DEFAULT_ENDPOINT_POLICY["burst"],
+        min_requests_per_second=DEFAULT_ENDPOINT_POLICY["min_requests_per_second"],
+        max_retries=DEFAULT_ENDPOINT_POLICY["max_retries"],
+        backoff_base=DEFAULT_ENDPOINT_POLICY["backoff_base"],
+        backoff_max=DEFAULT_ENDPOINT_POLICY["backoff_max"],
+        retry_timeouts=DEFAULT_ENDPOINT_POLICY["retry_timeouts"],
+        failure_threshold=DEFAULT_ENDPOINT_POLICY["failure_threshold"],
+        reset_timeout=DEFAULT_ENDPOINT_POLICY["reset_timeout"],
+        max_query_length=DEFAULT_ENDPOINT_POLICY["max_query_length"],
+    ):
+        self.rate_limiter = AdaptiveTokenBucket(
+            requests_per_second, burst, min_rate=min_requests_per_second
+        )
+        self.circuit_breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_timeouts = retry_timeouts
+        self.max_query_length = max_query_length
+        self.retries = 0
+        self.throttled_responses = 0
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def for_endpoint(cls, endpoint):
+        return cls(**{**DEFAULT_ENDPOINT_POLICY, **ENDPOINT_POLICIES.get(endpoint, {})})
+
+    def _is_retryable(self, error):
+        if isinstance(error, SPARQLTimeoutError):
+            return self.retry_timeouts
+        if isinstance(error, (SPARQLRateLimitError, SPARQLConnectionError)):
+            return True
+        # 4xx responses (malformed query, query too long) will not get better.
+        return error.status is None or error.status >= 500
+
+    def _backoff_delay(self, attempt, error):
+        # "Full jitter" exponential backoff, but never sooner than Retry-After.
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        retry_after = getattr(error, "retry_after", None)
+        return max(delay, retry_after or 0)
+
+    def execute(self, request):
+        attempt = 0
+        while True:
+            self.circuit_breaker.before_request()
+            self.rate_limiter.acquire()
+            try:
+                result = request()
+            except SPARQLEndpointError as e:
+                if isinstance(e, SPARQLRateLimitError):
+                    self.rate_limiter.record_throttle()
+                    with self._stats_lock:
+                        self.throttled_responses += 1
+                # Query timeouts and client errors say nothing about the health
+                # of the endpoint, so only the other failures trip the breaker.
+                if not isinstance(e, SPARQLTimeoutError) and (
+                    e.status is None or e.status >= 500 or e.status == 429
+                ):
+                    self.circuit_breaker.record_failure()
+                else:
+                    self.circuit_breaker.record_success()
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    raise
+                time.sleep(self._backoff_delay(attempt, e))
+                attempt += 1
+                with self._stats_lock:
+                    self.retries += 1
+                continue
+            except Exception:
+                # An unreadable response (e.g. a non-JSON body) also counts as
+                # a failure; it must release a half-open trial as well.
+                self.circuit_breaker.record_failure()
+                raise
+            self.circuit_breaker.record_success()
+            self.rate_limiter.record_success()
+            return result
+
+    def stats(self):
+        return {
+            "requests_per_second": self.rate_limiter.rate,
+            "retries": self.retries,
+            "throttled_responses": self.throttled_responses,
+            "circuit_state": self.circuit_breaker.state,
+            "circuit_opened": self.circuit_breaker.times_opened,
+        }
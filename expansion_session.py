@@ -0,0 +1,45 @@
+import time
+
+from set_extension import CompositeGraphBasedSetExtension
+
+
+class ExpansionSession:
+    # Interactive entity set expansion where seeds are added or removed one at
+    # a time. Per-entity adjacency and the explored entity sets are kept for
+    # the whole session, so a changed seed set only fetches the neighbourhood
+    # of new seeds and explores the entity sets not seen before.
+    def __init__(self, sparql_wrapper, seed_entities=(), **model_options):
+        model_options.setdefault("exploration_mode", "adjacency")
+        self.model = CompositeGraphBasedSetExtension(sparql_wrapper, **model_options)
+        self.model.explorer.keep_exploration_state = True
+        self.seed_entities = list(dict.fromkeys(seed_entities))
+        self.last_run_seconds = None
+        self._results = {}
+
+    def add_seed(self, entity):
+        if entity not in self.seed_entities:
+            self.seed_entities.append(entity)
+        return self.get_results()
+
+    def remove_seed(self, entity):
+        if entity in self.seed_entities:
+            self.seed_entities.remove(entity)
+        return self.get_results()
+
+    def set_seeds(self, seed_entities):
+        self.seed_entities = list(dict.fromkeys(seed_entities))
+        return self.get_results()
+
+    def get_results(self):
+        # Returns (expanded_entities, query, paths) like
+        # CompositeGraphBasedSetExtension.get_results.
+        key = frozenset(self.seed_entities)
+        start_time = time.perf_counter()
+        if key not in self._results:
+            self._results[key] = self.model.get_results(self.seed_entities)
+        self.last_run_seconds = time.perf_counter() - start_time
+        return self._results[key]
+
+    def clear(self):
+        self._results.clear()
+        self.model.explorer.clear_exploration_state()
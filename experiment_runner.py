@@ -2,10 +2,26 @@ import json
 import random
 from db_parser import DatabaseParser
 from sparql_wrapper import SPARQLWrapperCache
+from query_cache import PersistentQueryCache
+from exploration_artifacts import ExplorationArtifactStore
+from query_fingerprint import CanonicalQueryCache
 from set_extension import CompositeGraphBasedSetExtension
 from evaluation import EvaluationMetrics
 from visualization_manager import VisualizationManager
-from config import DEFAULT_SPARQL_ENDPOINT, DEFAULT_GRAPH, DEFAULT_TIMEOUT
+from config import (
+    DEFAULT_SPARQL_ENDPOINT,
+    DEFAULT_GRAPH,
+    DEFAULT_TIMEOUT,
+    DEFAULT_CACHE_PATH,
+    DEFAULT_CACHE_TTL_SECONDS,
+    DEFAULT_CACHE_MAX_ENTRIES,
+    DEFAULT_CACHE_MAX_BYTES,
+    DEFAULT_EXPLORATION_MODE,
+    DEFAULT_EDGE_FILTER_MODE,
+    DEFAULT_ARTIFACT_DIR,
+    DEFAULT_OPTIMIZE_QUERIES,
+    DEFAULT_USE_PREFIXED_NAMES,
+)
 
 
 class ExperimentRunner:
@@ -17,15 +33,44 @@ class ExperimentRunner:
         timeout=DEFAULT_TIMEOUT,
         output_dir="output",
         visualize=False,
+        cache_path=DEFAULT_CACHE_PATH,
+        exploration_mode=DEFAULT_EXPLORATION_MODE,
+        edge_filter_mode=DEFAULT_EDGE_FILTER_MODE,
+        artifact_dir=DEFAULT_ARTIFACT_DIR,
+        optimize_queries=DEFAULT_OPTIMIZE_QUERIES,
+        use_prefixed_names=DEFAULT_USE_PREFIXED_NAMES,
     ):
 
+        persistent_cache = None
+        if cache_path:
+            persistent_cache = PersistentQueryCache(
+                cache_path,
+                ttl_seconds=DEFAULT_CACHE_TTL_SECONDS,
+                max_entries=DEFAULT_CACHE_MAX_ENTRIES,
+                max_bytes=DEFAULT_CACHE_MAX_BYTES,
+            )
         self.sparql_wrapper = SPARQLWrapperCache(
-            sparql_endpoint, default_graph, timeout
+            sparql_endpoint, default_graph, timeout, persistent_cache=persistent_cache
         )
         self.db_parser = DatabaseParser(
             database_path, sparql_wrapper=self.sparql_wrapper
         )
         self.filter_pattern = '"(.*sameAs|.*wiki.*|.*seeAlso|.*wordnet_type|.*subdivision|.*subject|.*depiction|.*isPrimaryTopicOf|.*wasDerivedFrom|.*property.*|.*homepage|.*thumbnail|.*hypernym|.*exactMatch)"'
+        self.exploration_mode = exploration_mode
+        self.edge_filter_mode = edge_filter_mode
+        # Shared by all models so adjacency and predicate vocabulary fetched
+        # for one query are reused.
+        self.adjacency_cache = None
+        self.predicate_index = None
+        self.optimize_queries = optimize_queries
+        self.query_optimizer = None
+        self.use_prefixed_names = use_prefixed_names
+        # Generated queries that are identical up to variable renaming and
+        # pattern order run once across all seed sets and templates.
+        self.query_result_cache = CanonicalQueryCache()
+        self.artifact_store = (
+            ExplorationArtifactStore(artifact_dir) if artifact_dir else None
+        )
         self.results_by_template = {}
         self.visualize = visualize
         self.viz_manager = VisualizationManager(output_dir) if visualize else None
@@ -37,14 +82,27 @@ class ExperimentRunner:
         min_entities_for_values_clause=2,
         max_entities_in_path_node=5,
     ):
-        return CompositeGraphBasedSetExtension(
+        model = CompositeGraphBasedSetExtension(
             self.sparql_wrapper,
             path_length=path_length,
             right_extensions=right_extensions,
             filter_pattern=self.filter_pattern,
             min_entities_for_values_clause=min_entities_for_values_clause,
             max_entities_in_path_node=max_entities_in_path_node,
+            exploration_mode=self.exploration_mode,
+            adjacency_cache=self.adjacency_cache,
+            edge_filter_mode=self.edge_filter_mode,
+            predicate_index=self.predicate_index,
+            artifact_store=self.artifact_store,
+            optimize_queries=self.optimize_queries,
+            query_optimizer=self.query_optimizer,
+            use_prefixed_names=self.use_prefixed_names,
+            query_result_cache=self.query_result_cache,
         )
+        self.adjacency_cache = model.explorer.adjacency_cache
+        self.predicate_index = model.explorer.predicate_index
+        self.query_optimizer = model.generator.optimizer
+        return model
 
     def run_experiment_on_query(
         self, query_item, sample_size=5, template_id_for_viz=None
@@ -66,7 +124,10 @@ class ExperimentRunner:
                 f"  Query {query_id}: No pre-defined results, executing original query to get 'actual' entities."
             )
             try:
-                bindings = self.sparql_wrapper.run_query(original_sparql_query)
+                # Rows are collected locally so that a failure mid-stream
+                # leaves the ground truth empty instead of partial.
+                streamed_entities = []
+                bindings = self.sparql_wrapper.iter_query(original_sparql_query)
                 for binding in bindings:
                     for var_name in binding:
                         if (
@@ -74,11 +135,9 @@ class ExperimentRunner:
                             and "http://dbpedia.org/resource/"
                             in binding[var_name]["value"]
                         ):
-                            actual_entities_ground_truth.append(
-                                binding[var_name]["value"]
-                            )
+                            streamed_entities.append(binding[var_name]["value"])
                             break
-                actual_entities_ground_truth = list(set(actual_entities_ground_truth))
+                actual_entities_ground_truth = list(set(streamed_entities))
             except Exception as e:
                 print(f"  Error running original query for {query_id}: {e}")
 
@@ -132,6 +191,8 @@ class ExperimentRunner:
             "actual_entities_ground_truth": actual_entities_ground_truth,
             "expanded_entities": expanded_entities,
             "generated_query": generated_query_str,
+            "query_fingerprint": model.last_query_fingerprint,
+            "query_cache_hit": model.last_query_cache_hit,
             "metrics": {"precision": precision, "recall": recall, "f1": f1},
             "visualizations": (
                 {"paths": viz_paths_file, "entities": viz_entities_file}
@@ -207,6 +268,7 @@ class ExperimentRunner:
                 print(
                     f"Template {tid} Average: P={avg_p:.2f}, R={avg_r:.2f}, F1={avg_f1:.2f} (from {len(template_results)} queries)"
                 )
+                self.report_query_cache_stats(tid, template_results)
 
         if self.visualize and self.viz_manager and metrics_summary_for_viz:
             summary_viz_path = self.viz_manager.save_summary_visualization(
@@ -218,6 +280,16 @@ class ExperimentRunner:
                 )
         return self.results_by_template
 
+    def report_query_cache_stats(self, template_id, template_results):
+        generated = [r for r in template_results if r["query_fingerprint"]]
+        if not generated:
+            return
+        hits = sum(1 for r in generated if r["query_cache_hit"])
+        structures = len({r["query_fingerprint"] for r in generated})
+        print(
+            f"Template {template_id} query cache: {hits}/{len(generated)} hits ({hits / len(generated):.0%}), {structures} distinct query structures"
+        )
+
     def save_results(self, filename="experiment_results.json"):
         output_path = filename
         if self.visualize and self.viz_manager:
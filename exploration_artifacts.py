@@ -0,0 +1,133 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+
+from path_model import EntityGroup, PathSegment
+from config import DEFAULT_ARTIFACT_DIR
+
+# Bumped whenever the stored layout changes so old artifacts are not loaded.
+ARTIFACT_FORMAT_VERSION = 1
+
+# Explorations cut short by these budgets are neither stored nor reused: time
+# varies from run to run, and the number of queries needed for the same paths
+# depends on settings left out of the exploration config (modes, combined and
+# pre-aggregated neighbour queries).
+UNREPRODUCIBLE_STOP_REASONS = frozenset(["max_seconds", "max_queries"])
+
+
+def encode_paths(paths):
+    # Every URI and entity group is stored once; a path is a flat list of
+    # (source group, edge URI, target group) indices.
+    uri_indices = {}
+    group_indices = {}
+    groups = []
+
+    def uri_index(uri):
+        if uri not in uri_indices:
+            uri_indices[uri] = len(uri_indices)
+        return uri_indices[uri]
+
+    def group_index(nodes):
+        uris = tuple(nodes)
+        if uris not in group_indices:
+            group_indices[uris] = len(groups)
+            groups.append([uri_index(uri) for uri in uris])
+        return group_indices[uris]
+
+    encoded_paths = []
+    for path_segments in paths:
+        encoded_path = []
+        for source_nodes, edge_uri, target_nodes in path_segments:
+            encoded_path.extend(
+                (
+                    group_index(source_nodes),
+                    uri_index(edge_uri),
+                    group_index(target_nodes),
+                )
+            )
+        encoded_paths.append(encoded_path)
+    return {"uris": list(uri_indices), "groups": groups, "paths": encoded_paths}
+
+
+def decode_paths(encoded):
+    uris = encoded["uris"]
+    groups = [
+        EntityGroup(uris[index] for index in group) for group in encoded["groups"]
+    ]
+    return [
+        [
+            PathSegment(groups[path[i]], uris[path[i + 1]], groups[path[i + 2]])
+            for i in range(0, len(path), 3)
+        ]
+        for path in encoded["paths"]
+    ]
+
+
+class ExplorationArtifactStore:
+    # get_expansion_graph output kept on disk per seed set and exploration
+    # config, so the path processing and query generation stages can be re-run
+    # without exploring the graph again.
+    def __init__(self, directory=DEFAULT_ARTIFACT_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def artifact_key(self, start_entities, exploration_config):
+        payload = json.dumps(
+            {
+                "version": ARTIFACT_FORMAT_VERSION,
+                "seeds": sorted(set(start_entities)),
+                "config": exploration_config,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def artifact_path(self, start_entities, exploration_config):
+        key = self.artifact_key(start_entities, exploration_config)
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def load(self, start_entities, exploration_config):
+        path = self.artifact_path(start_entities, exploration_config)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                artifact = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable exploration artifact {path}: {e}")
+            self.misses += 1
+            return None
+        if (
+            artifact.get("version") != ARTIFACT_FORMAT_VERSION
+            or artifact.get("seeds") != sorted(set(start_entities))
+            or artifact.get("config") != exploration_config
+            or artifact.get("stop_reason") in UNREPRODUCIBLE_STOP_REASONS
+        ):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return decode_paths(artifact)
+
+    def save(self, start_entities, exploration_config, paths, stop_reason=None):
+        # Returns the artifact path, or None when the paths are not stored.
+        if stop_reason in UNREPRODUCIBLE_STOP_REASONS:
+            return None
+        path = self.artifact_path(start_entities, exploration_config)
+        artifact = {
+            "version": ARTIFACT_FORMAT_VERSION,
+            "created": time.time(),
+            "seeds": sorted(set(start_entities)),
+            "config": exploration_config,
+            "stop_reason": stop_reason,
+        }
+        artifact.update(encode_paths(paths))
+        temporary_path = f"{path}.tmp"
+        with gzip.open(temporary_path, "wt", encoding="utf-8") as f:
+            json.dump(artifact, f, separators=(",", ":"))
+        os.replace(temporary_path, path)
+        return path
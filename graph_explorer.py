@@ -1,4 +1,66 @@
 # graph_explorer.py
+import hashlib
+import heapq
+import itertools
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from adjacency_cache import AdjacencyCache
+from path_model import EntityGroup, PathSegment
+from predicate_index import PredicateIndex
+from sparql_errors import SPARQLTimeoutError
+from sparql_results import iter_result_rows
+from config import (
+    DEFAULT_EXPLORER_RESULT_FORMAT,
+    DEFAULT_SPLIT_ON_TIMEOUT,
+    DEFAULT_EXPLORATION_MODE,
+    DEFAULT_EXPLORER_MAX_WORKERS,
+    DEFAULT_COMBINE_NEIGHBOUR_QUERIES,
+    DEFAULT_PREAGGREGATE_FANOUT,
+    DEFAULT_EDGE_FILTER_MODE,
+    DEFAULT_EXPLORATION_STRATEGY,
+    DEFAULT_EXPLORATION_MAX_QUERIES,
+    DEFAULT_EXPLORATION_MAX_SECONDS,
+    DEFAULT_EXPLORATION_MAX_PATHS,
+)
+
+
+class QueryBudgetExceeded(Exception):
+    # Raised instead of issuing a neighbour query past the max_queries budget.
+    pass
+
+
+class ExplorationBudget:
+    # Limits on a single get_expansion_graph call; None means unlimited.
+    def __init__(
+        self,
+        max_queries=DEFAULT_EXPLORATION_MAX_QUERIES,
+        max_seconds=DEFAULT_EXPLORATION_MAX_SECONDS,
+        max_paths=DEFAULT_EXPLORATION_MAX_PATHS,
+    ):
+        self.max_queries = max_queries
+        self.max_seconds = max_seconds
+        self.max_paths = max_paths
+        self._started = time.monotonic()
+
+    def start(self):
+        self._started = time.monotonic()
+
+    def exhausted(self, queries, paths):
+        if self.max_paths is not None and paths >= self.max_paths:
+            return "max_paths"
+        if self.max_queries is not None and queries >= self.max_queries:
+            return "max_queries"
+        if (
+            self.max_seconds is not None
+            and time.monotonic() - self._started >= self.max_seconds
+        ):
+            return "max_seconds"
+        return None
+
+
 class GraphExplorer:
     def __init__(
         self,
@@ -7,8 +69,37 @@ class GraphExplorer:
         path_length=4,
         right_extensions=0,
         max_entities_in_path_node=5,
+        result_format=DEFAULT_EXPLORER_RESULT_FORMAT,
+        split_on_timeout=DEFAULT_SPLIT_ON_TIMEOUT,
+        exploration_mode=DEFAULT_EXPLORATION_MODE,
+        adjacency_cache=None,
+        max_workers=DEFAULT_EXPLORER_MAX_WORKERS,
+        combine_neighbour_queries=DEFAULT_COMBINE_NEIGHBOUR_QUERIES,
+        preaggregate_fanout=DEFAULT_PREAGGREGATE_FANOUT,
+        edge_filter_mode=DEFAULT_EDGE_FILTER_MODE,
+        predicate_index=None,
+        strategy=DEFAULT_EXPLORATION_STRATEGY,
+        budget=None,
+        keep_exploration_state=False,
     ):
         self.sparql = sparql_wrapper
+        self.max_workers = max_workers
+        self.strategy = strategy
+        self.budget = budget or ExplorationBudget()
+        self.stop_reason = None
+        self.keep_exploration_state = keep_exploration_state
+        self._exploration_state = ({}, {})
+        self.queries_issued = 0
+        self._queries_at_start = 0
+        self._enforce_query_budget = False
+        self._stats_lock = threading.Lock()
+        self.combine_neighbour_queries = combine_neighbour_queries
+        self.preaggregate_fanout = preaggregate_fanout
+        self.result_format = result_format
+        self.split_on_timeout = split_on_timeout
+        self.split_queries = 0
+        self.memo_hits = 0
+        self.pruned_fanout_edges = 0
         self.path_length = path_length
         self.right_extensions = right_extensions
         # Store the raw filter pattern.
@@ -16,32 +107,118 @@ class GraphExplorer:
         # For the current pattern, this is not an issue.
         self.filter_pattern_str = filter_pattern
         self.max_entities_in_path_node = max_entities_in_path_node
+        # How excluded edges are filtered: "regex" on the endpoint, "index" with
+        # explicit predicate IRIs resolved from the endpoint's vocabulary, or
+        # "client" with Python regular expressions on the fetched rows.
+        self.edge_filter_mode = edge_filter_mode
+        self.predicate_index = None
+        self._excluded_edge_pattern = None
+        self._edge_filter_sparql = None
+        if edge_filter_mode == "index":
+            self.predicate_index = predicate_index or PredicateIndex(
+                sparql_wrapper, result_format=result_format
+            )
+        elif edge_filter_mode == "client":
+            self._excluded_edge_pattern = re.compile(filter_pattern)
+        # In "adjacency" mode neighbours are intersected locally from per-entity
+        # adjacency lists; a cache can be shared by explorers using the same
+        # endpoint and filter pattern.
+        self.adjacency_cache = None
+        if exploration_mode == "adjacency":
+            self.adjacency_cache = adjacency_cache or AdjacencyCache(
+                sparql_wrapper,
+                self._build_edge_filter_sparql(),
+                result_format,
+                excluded_edge_pattern=self._excluded_edge_pattern,
+            )
 
     def _build_regex_filter_sparql(self):
         # Escape backslashes and use single quotes which work better with SPARQL
         escaped_pattern = self.filter_pattern_str.replace("\\", "\\\\")
         return f"!regex(str(?edge), '{escaped_pattern}')"
 
-    def get_left_resolved_neighbours_from_entities(self, entities):
-        regex_filter = self._build_regex_filter_sparql()
-        QUERY = f"""SELECT DISTINCT ?entity1 ?edge
+    def _build_edge_filter_sparql(self):
+        if self._edge_filter_sparql is None:
+            expression = None
+            if self.edge_filter_mode == "index":
+                expression = self.predicate_index.filter_expression(
+                    self.filter_pattern_str
+                )
+                if expression is None:
+                    print(
+                        "Warning: Too many predicates match the filter pattern, "
+                        "falling back to regex filtering."
+                    )
+            elif self.edge_filter_mode == "client":
+                expression = "true"
+            self._edge_filter_sparql = expression or self._build_regex_filter_sparql()
+        return self._edge_filter_sparql
+
+    def _iter_result_rows(self, QUERY, variables):
+        with self._stats_lock:
+            # The budget is checked before every query, so concurrent workers
+            # cannot overshoot max_queries.
+            if (
+                self._enforce_query_budget
+                and self.budget.max_queries is not None
+                and self._queries_issued() - self._queries_at_start
+                >= self.budget.max_queries
+            ):
+                raise QueryBudgetExceeded()
+            self.queries_issued += 1
+        rows = iter_result_rows(self.sparql, QUERY, variables, self.result_format)
+        if self._excluded_edge_pattern is None or "edge" not in variables:
+            return rows
+        edge_position = variables.index("edge")
+        return (
+            row
+            for row in rows
+            if row[edge_position] is None
+            or not self._excluded_edge_pattern.search(row[edge_position])
+        )
+
+    def _format_entities_for_values(self, entities):
+        return " ".join(
+            [
+                entity if "http" not in entity else "<" + entity + ">"
+                for entity in entities
+            ]
+        )
+
+    def _build_edge_values_clause(self, edges):
+        if edges is None:
+            return ""
+        return "VALUES ?edge { " + " ".join("<" + edge + ">" for edge in edges) + " }"
+
+    def _build_resolved_neighbours_query(self, entities, direction, edges=None):
+        edge_filter = self._build_edge_filter_sparql()
+        edge_values = self._build_edge_values_clause(edges)
+        triple_pattern = (
+            "?entity ?edge ?entity1 ."
+            if direction == "left"
+            else "?entity1 ?edge ?entity ."
+        )
+        if len(entities) == 1:
+            # With a single entity the HAVING clause always holds, so the
+            # aggregation can be skipped.
+            return f"""SELECT DISTINCT ?entity1 ?edge
                 WHERE {{
-                    VALUES ?entity {{ {" ".join([entity if "http" not in entity else "<"+entity+">" for entity in entities])} }}
-                    ?entity ?edge ?entity1 .
-                    FILTER (isURI(?entity1) && {regex_filter})
+                    VALUES ?entity {{ {self._format_entities_for_values(entities)} }}
+                    {edge_values}
+                    {triple_pattern}
+                    FILTER (isURI(?entity1) && {edge_filter})
+                }}"""
+        return f"""SELECT DISTINCT ?entity1 ?edge
+                WHERE {{
+                    VALUES ?entity {{ {self._format_entities_for_values(entities)} }}
+                    {edge_values}
+                    {triple_pattern}
+                    FILTER (isURI(?entity1) && {edge_filter})
                 }}
                 GROUP BY ?edge ?entity1
                 HAVING (COUNT(?entity) > {len(entities)-1})"""
-        try:
-            results = self.sparql.run_query(QUERY)
-        except Exception as e:
-            # print(f"Error in get_left_resolved_neighbours_from_entities: {e}\nQuery: {QUERY}")
-            return []
-        return [
-            (result["edge"]["value"], result["entity1"]["value"]) for result in results
-        ]
 
-    def get_left_expandable_neighbours_from_entities(self, entities, resolved_edges):
+    def _build_left_expandable_query(self, entities, resolved_edges, edges=None):
         resolved_edges_filter_part = ""
         if resolved_edges:
             resolved_edges_filter_part = (
@@ -50,18 +227,30 @@ class GraphExplorer:
                 + "))"
             )
 
-        regex_filter = self._build_regex_filter_sparql()
+        edge_filter = self._build_edge_filter_sparql()
+        edge_values = self._build_edge_values_clause(edges)
 
-        QUERY = f"""SELECT DISTINCT ?entity1 ?edge ?entity2
+        if len(entities) == 1:
+            return f"""SELECT DISTINCT ?entity1 ?edge ?entity2
+                WHERE {{
+                    VALUES ?entity1 {{ {self._format_entities_for_values(entities)} }}
+                    {edge_values}
+                    {{?entity1 ?edge ?entity2}} .
+                    {resolved_edges_filter_part}
+                    FILTER (isURI(?entity2) && {edge_filter})
+                }}
+                """
+        return f"""SELECT DISTINCT ?entity1 ?edge ?entity2
                 WHERE {{
-                    VALUES ?entity1 {{ {" ".join([entity if "http" not in entity else "<"+entity+">" for entity in entities])} }}
+                    VALUES ?entity1 {{ {self._format_entities_for_values(entities)} }}
+                    {edge_values}
                     {{?entity1 ?edge ?entity2}} .
                     {{
                         SELECT DISTINCT ?edge
                         WHERE {{
                             SELECT DISTINCT ?entity13 ?edge
                             WHERE {{
-                                VALUES ?entity13 {{ {" ".join([entity if "http" not in entity else "<"+entity+">" for entity in entities])} }}
+                                VALUES ?entity13 {{ {self._format_entities_for_values(entities)} }}
                                 ?entity13 ?edge ?entity23 .
                                 FILTER (isURI(?entity23))
                             }}
@@ -71,49 +260,199 @@ class GraphExplorer:
                         HAVING (COUNT(?entity13) > {len(entities)-1})
                     }}
                     {resolved_edges_filter_part}
-                    FILTER (isURI(?entity2) && {regex_filter})
+                    FILTER (isURI(?entity2) && {edge_filter})
                 }}
                 """
-        try:
-            results = self.sparql.run_query(QUERY)
-        except Exception as e:
-            # print(f"Error in get_left_expandable_neighbours_from_entities: {e}\nQuery: {QUERY}")
-            return []
-        return [
-            (
-                result["entity1"]["value"],
-                result["edge"]["value"],
-                result["entity2"]["value"],
-            )
-            for result in results
-        ]
 
-    def get_right_resolved_neighbours_from_entities(self, entities):
-        regex_filter = self._build_regex_filter_sparql()
-        QUERY = f"""SELECT DISTINCT ?entity1 ?edge
+    def _build_entity_edges_query(self, entity, direction):
+        edge_filter = self._build_edge_filter_sparql()
+        triple_pattern = (
+            "?entity ?edge ?neighbour ."
+            if direction == "left"
+            else "?neighbour ?edge ?entity ."
+        )
+        return f"""SELECT DISTINCT ?edge
                 WHERE {{
-                    VALUES ?entity {{ {" ".join([entity if "http" not in entity else "<"+entity+">" for entity in entities])} }}
-                    ?entity1 ?edge ?entity .
-                    FILTER (isURI(?entity1) && {regex_filter})
+                    VALUES ?entity {{ {self._format_entities_for_values([entity])} }}
+                    {triple_pattern}
+                    FILTER (isURI(?neighbour) && {edge_filter})
+                }}"""
+
+    def _build_expandable_fanout_query(self, entities):
+        # Number of distinct targets per expandable edge, so that edges leading
+        # to too many entities are never downloaded.
+        return f"""SELECT ?edge (COUNT(DISTINCT ?entity2) AS ?targets)
+                WHERE {{
+                    {{ {self._build_left_expandable_query(entities, None)} }}
                 }}
-                GROUP BY ?edge ?entity1
-                HAVING (COUNT(?entity) > {len(entities)-1})"""
+                GROUP BY ?edge"""
+
+    def _build_combined_neighbours_query(self, entities, kinds):
+        # One UNION branch per neighbour kind, tagged in ?kind. Resolved edges
+        # are removed from the expandable rows on the client.
+        branch_queries = {
+            "left_resolved": self._build_resolved_neighbours_query(entities, "left"),
+            "right_resolved": self._build_resolved_neighbours_query(entities, "right"),
+            "left_expandable": self._build_left_expandable_query(entities, None),
+            "left_expandable_fanout": self._build_expandable_fanout_query(entities),
+        }
+        branches = " UNION ".join(
+            f'{{ {{ {branch_queries[kind]} }} BIND ("{kind}" AS ?kind) }}'
+            for kind in kinds
+        )
+        return f"""SELECT ?kind ?entity1 ?edge ?entity2 ?targets
+                WHERE {{
+                    {branches}
+                }}"""
+
+    def _get_combined_neighbours(self, entities, include_right):
+        expandable_kind = (
+            "left_expandable_fanout" if self.preaggregate_fanout else "left_expandable"
+        )
+        kinds = ["left_resolved", expandable_kind]
+        if include_right:
+            kinds.append("right_resolved")
+        QUERY = self._build_combined_neighbours_query(entities, kinds)
+        rows_by_kind = {kind: [] for kind in kinds}
+        for kind, entity1, edge, entity2, targets in self._iter_result_rows(
+            QUERY, ("kind", "entity1", "edge", "entity2", "targets")
+        ):
+            if kind == "left_expandable":
+                rows_by_kind[kind].append((entity1, edge, entity2))
+            elif kind == "left_expandable_fanout":
+                rows_by_kind[kind].append((edge, targets))
+            else:
+                rows_by_kind[kind].append((edge, entity1))
+        resolved_edges = {edge for edge, _ in rows_by_kind["left_resolved"]}
+        if self.preaggregate_fanout:
+            expandable_left_triplets = self._get_capped_expandable_rows(
+                entities, resolved_edges, rows_by_kind["left_expandable_fanout"]
+            )
+        else:
+            expandable_left_triplets = [
+                row
+                for row in rows_by_kind["left_expandable"]
+                if row[1] not in resolved_edges
+            ]
+        return (
+            rows_by_kind.get("right_resolved"),
+            rows_by_kind["left_resolved"],
+            expandable_left_triplets,
+        )
+
+    def _get_capped_expandable_rows(self, entities, resolved_edges, fanout):
+        # Edges with max_entities_in_path_node or more targets would be
+        # discarded by the expansion anyway.
+        edges = sorted(
+            edge
+            for edge, targets in fanout
+            if int(targets) < self.max_entities_in_path_node
+            and edge not in resolved_edges
+        )
+        with self._stats_lock:
+            self.pruned_fanout_edges += len(fanout) - len(edges)
+        if not edges:
+            return []
+        return self._get_neighbour_rows("left_expandable", list(entities), None, edges)
+
+    def _query_neighbour_rows(self, kind, entities, resolved_edges, edges):
+        if kind == "left_expandable":
+            QUERY = self._build_left_expandable_query(entities, resolved_edges, edges)
+            return list(self._iter_result_rows(QUERY, ("entity1", "edge", "entity2")))
+        direction = "left" if kind == "left_resolved" else "right"
+        QUERY = self._build_resolved_neighbours_query(entities, direction, edges)
+        return list(self._iter_result_rows(QUERY, ("entity1", "edge")))
+
+    @staticmethod
+    def _neighbour_row_key(kind, row):
+        # Resolved rows must be shared by every entity; expandable rows only
+        # need their edge to be shared.
+        return row[1] if kind == "left_expandable" else row
+
+    def _get_neighbour_rows(self, kind, entities, resolved_edges=None, edges=None):
+        if self.adjacency_cache is not None and edges is None:
+            rows = self.adjacency_cache.neighbour_rows(kind, entities, resolved_edges)
+            # None means some entity has too many neighbours to cache, so the
+            # aggregation is left to the endpoint.
+            if rows is not None:
+                return rows
         try:
-            results = self.sparql.run_query(QUERY)
-        except Exception as e:
-            # print(f"Error in get_right_resolved_neighbours_from_entities: {e}\nQuery: {QUERY}")
+            return self._query_neighbour_rows(kind, entities, resolved_edges, edges)
+        except SPARQLTimeoutError:
+            if not self.split_on_timeout:
+                raise
+        with self._stats_lock:
+            self.split_queries += 1
+
+        if len(entities) > 1:
+            # A row qualifies for the whole set exactly when it qualifies for
+            # both halves, so the halves' results are intersected client-side.
+            middle = len(entities) // 2
+            part_rows = []
+            common_keys = None
+            for part in (entities[:middle], entities[middle:]):
+                rows = self._get_neighbour_rows(kind, part, resolved_edges, edges)
+                keys = {self._neighbour_row_key(kind, row) for row in rows}
+                common_keys = keys if common_keys is None else common_keys & keys
+                if not common_keys:
+                    return []
+                part_rows.append(rows)
+            merged_rows = []
+            seen_rows = set()
+            for rows in part_rows:
+                for row in rows:
+                    if (
+                        row not in seen_rows
+                        and self._neighbour_row_key(kind, row) in common_keys
+                    ):
+                        seen_rows.add(row)
+                        merged_rows.append(row)
+            return merged_rows
+
+        if edges is None:
+            direction = "right" if kind == "right_resolved" else "left"
+            QUERY = self._build_entity_edges_query(entities[0], direction)
+            edges = sorted(edge for (edge,) in self._iter_result_rows(QUERY, ("edge",)))
+            if resolved_edges:
+                edges = [edge for edge in edges if edge not in resolved_edges]
+        if not edges:
             return []
-        return [
-            (result["edge"]["value"], result["entity1"]["value"]) for result in results
-        ]
+        if len(edges) == 1:
+            # A single predicate cannot be split any further.
+            raise SPARQLTimeoutError(
+                f"Query for <{entities[0]}> timed out even for a single predicate"
+            )
+        middle = (len(edges) + 1) // 2
+        return self._get_neighbour_rows(
+            kind, entities, resolved_edges, edges[:middle]
+        ) + self._get_neighbour_rows(kind, entities, resolved_edges, edges[middle:])
 
-    # ... (The rest of GraphExplorer: get_left_neighbours_of_entities, get_right_neighbours_of_entities, get_expansion_graph, sort_... methods remain unchanged from the previous "cleaned comments" version)
-    def get_left_neighbours_of_entities(self, entities):
-        resolved_entities = self.get_left_resolved_neighbours_from_entities(entities)
-        resolved_edges = {edge for edge, _ in resolved_entities}
-        expandable_entities = self.get_left_expandable_neighbours_from_entities(
-            entities, resolved_edges
+    def get_left_resolved_neighbours_from_entities(self, entities):
+        results = self._get_neighbour_rows("left_resolved", list(entities))
+        return [(edge, entity1) for entity1, edge in results]
+
+    def get_left_expandable_neighbours_from_entities(self, entities, resolved_edges):
+        if self.preaggregate_fanout and self.adjacency_cache is None:
+            QUERY = self._build_expandable_fanout_query(entities)
+            try:
+                fanout = list(self._iter_result_rows(QUERY, ("edge", "targets")))
+            except SPARQLTimeoutError:
+                if not self.split_on_timeout:
+                    raise
+            else:
+                return self._get_capped_expandable_rows(
+                    entities, resolved_edges or set(), fanout
+                )
+        return self._get_neighbour_rows(
+            "left_expandable", list(entities), resolved_edges
         )
+
+    def get_right_resolved_neighbours_from_entities(self, entities):
+        results = self._get_neighbour_rows("right_resolved", list(entities))
+        return [(edge, entity1) for entity1, edge in results]
+
+    def _left_resolved_segments(self, entities, resolved_entities):
+        resolved_edges = {edge for edge, _ in resolved_entities}
         resolved_entities_listed = []
         for edge_uri in resolved_edges:
             target_entities_for_edge = [
@@ -123,10 +462,9 @@ class GraphExplorer:
                 resolved_entities_listed.append(
                     (entities, edge_uri, target_entities_for_edge)
                 )
-        return resolved_entities_listed, expandable_entities
+        return resolved_entities_listed
 
-    def get_right_neighbours_of_entities(self, entities):
-        resolved_entities = self.get_right_resolved_neighbours_from_entities(entities)
+    def _right_resolved_segments(self, entities, resolved_entities):
         resolved_edges = {edge for edge, _ in resolved_entities}
         resolved_entities_listed = []
         for edge_uri in resolved_edges:
@@ -139,70 +477,313 @@ class GraphExplorer:
                 )
         return resolved_entities_listed
 
+    def get_left_neighbours_of_entities(self, entities):
+        resolved_entities = self.get_left_resolved_neighbours_from_entities(entities)
+        resolved_edges = {edge for edge, _ in resolved_entities}
+        expandable_entities = self.get_left_expandable_neighbours_from_entities(
+            entities, resolved_edges
+        )
+        return (
+            self._left_resolved_segments(entities, resolved_entities),
+            expandable_entities,
+        )
+
+    def get_right_neighbours_of_entities(self, entities):
+        resolved_entities = self.get_right_resolved_neighbours_from_entities(entities)
+        return self._right_resolved_segments(entities, resolved_entities)
+
+    def _fetch_neighbours(self, entities, include_right, known):
+        right_resolved, left_resolved, expandable_left_triplets = known
+        if (
+            self.combine_neighbour_queries
+            and self.adjacency_cache is None
+            and left_resolved is None
+        ):
+            try:
+                return self._get_combined_neighbours(entities, include_right)
+            except SPARQLTimeoutError:
+                # The separate queries are smaller and can be split further.
+                if not self.split_on_timeout:
+                    raise
+        if include_right and right_resolved is None:
+            right_resolved = self.get_right_resolved_neighbours_from_entities(entities)
+        if left_resolved is None:
+            left_resolved = self.get_left_resolved_neighbours_from_entities(entities)
+            expandable_left_triplets = (
+                self.get_left_expandable_neighbours_from_entities(
+                    entities, {edge for edge, _ in left_resolved}
+                )
+            )
+        return right_resolved, left_resolved, expandable_left_triplets
+
+    def _fetch_frontier(self, frontier, executor, neighbours):
+        # The neighbours of an entity set do not depend on the path leading to
+        # it, so each distinct set is queried once per expansion; `neighbours`
+        # keeps the results of earlier levels.
+        # Entity sets whose queries would exceed the query budget are left
+        # out of `neighbours`; see _has_neighbours.
+        missing_sets = {}
+        for entry in frontier:
+            current_entities, _, path_length = entry
+            key = current_entities.key
+            if not self._has_neighbours(entry, neighbours):
+                missing_sets.setdefault(
+                    key,
+                    (
+                        current_entities,
+                        path_length < self.right_extensions,
+                        neighbours.get(key, (None, None, None)),
+                    ),
+                )
+        if executor is None or len(missing_sets) <= 1:
+            for key, args in missing_sets.items():
+                try:
+                    neighbours[key] = self._fetch_neighbours(*args)
+                except QueryBudgetExceeded:
+                    return
+            return
+        futures = {
+            key: executor.submit(self._fetch_neighbours, *args)
+            for key, args in missing_sets.items()
+        }
+        for key, future in futures.items():
+            try:
+                neighbours[key] = future.result()
+            except QueryBudgetExceeded:
+                continue
+
+    def _has_neighbours(self, entry, neighbours):
+        current_entities, _, path_length = entry
+        right_resolved, left_resolved, _ = neighbours.get(
+            current_entities.key, (None, None, None)
+        )
+        return left_resolved is not None and (
+            path_length >= self.right_extensions or right_resolved is not None
+        )
+
+    def _neighbour_candidates(self, current_entities, neighbours, include_right):
+        # Everything about an entity set's next steps that does not depend on
+        # the path prefix: resolved (edge, nodes) pairs and the expandable
+        # children, already filtered by size.
+        right_resolved, left_resolved, expandable_left_triplets = neighbours
+        right_candidates = []
+        if include_right:
+            for source_nodes, edge_uri, _ in self._right_resolved_segments(
+                current_entities, right_resolved
+            ):
+                if len(source_nodes) < self.max_entities_in_path_node:
+                    right_candidates.append((edge_uri, EntityGroup(source_nodes)))
+
+        left_candidates = []
+        for _, edge_uri, target_nodes in self._left_resolved_segments(
+            current_entities, left_resolved
+        ):
+            if len(target_nodes) < self.max_entities_in_path_node:
+                left_candidates.append((edge_uri, EntityGroup(target_nodes)))
+
+        expandable_edges_map = {}
+        for e1, edge, e2 in expandable_left_triplets:
+            if edge not in expandable_edges_map:
+                expandable_edges_map[edge] = []
+            if e2 not in expandable_edges_map[edge]:
+                expandable_edges_map[edge].append(e2)
+
+        child_candidates = []
+        for edge_uri, target_nodes_list in expandable_edges_map.items():
+            unique_target_nodes = list(set(target_nodes_list))
+            if 0 < len(unique_target_nodes) < self.max_entities_in_path_node:
+                child_candidates.append((edge_uri, EntityGroup(unique_target_nodes)))
+        return right_candidates, left_candidates, child_candidates
+
     def get_expansion_graph(self, start_entities):
-        found_paths = []
-        stack = [(list(start_entities), [], 0)]
+        self.stop_reason = None
+        self.budget.start()
+        self._queries_at_start = self._queries_issued()
+        expand = (
+            self._expand_best_first
+            if self.strategy == "best_first"
+            else self._expand_levels
+        )
+        self._enforce_query_budget = True
+        try:
+            if self.max_workers > 1:
+                with ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="graph-explorer"
+                ) as executor:
+                    found_paths = expand(start_entities, executor)
+            else:
+                found_paths = expand(start_entities, None)
+        finally:
+            self._enforce_query_budget = False
+
+        if (
+            self.budget.max_paths is not None
+            and len(found_paths) > self.budget.max_paths
+        ):
+            found_paths = found_paths[: self.budget.max_paths]
+            self.stop_reason = "max_paths"
+        if self.stop_reason:
+            print(
+                f"Exploration stopped by the {self.stop_reason} budget after "
+                f"{self._queries_issued() - self._queries_at_start} queries with "
+                f"{len(found_paths)} paths."
+            )
+        return found_paths
+
+    def exploration_config(self):
+        # Settings that decide which paths get_expansion_graph returns. Modes,
+        # workers and batching only change how the same paths are fetched,
+        # unless a query or time budget cuts the exploration short; such
+        # results are not reused (see exploration_artifacts).
+        return {
+            "endpoint": self.sparql.endpoint,
+            "graph": self.sparql.default_graph,
+            "filter_pattern": hashlib.sha256(
+                self.filter_pattern_str.encode("utf-8")
+            ).hexdigest(),
+            "path_length": self.path_length,
+            "right_extensions": self.right_extensions,
+            "max_entities_in_path_node": self.max_entities_in_path_node,
+            "strategy": self.strategy,
+            "budget": [
+                self.budget.max_queries,
+                self.budget.max_seconds,
+                self.budget.max_paths,
+            ],
+        }
+
+    def _exploration_tables(self):
+        # Neighbour results and candidates per entity set. They are kept
+        # between calls when keep_exploration_state is set, so re-expanding a
+        # changed seed set only queries the entity sets not seen before.
+        if self.keep_exploration_state:
+            return self._exploration_state
+        return {}, {}
+
+    def clear_exploration_state(self):
+        self._exploration_state = ({}, {})
+
+    def _queries_issued(self):
+        adjacency_queries = (
+            self.adjacency_cache.adjacency_queries if self.adjacency_cache else 0
+        )
+        return self.queries_issued + adjacency_queries
+
+    def _budget_exhausted(self, found_paths):
+        self.stop_reason = self.budget.exhausted(
+            self._queries_issued() - self._queries_at_start, len(found_paths)
+        )
+        return self.stop_reason is not None
+
+    def _expand_entry(self, entry, neighbours, candidates_memo, found_paths):
+        # Appends the paths completed from one queue entry to found_paths and
+        # returns the entries for its expandable children.
+        current_entities, current_path_segments, path_length = entry
+        key = current_entities.key
+        memo_key = (key, self.path_length - path_length)
+        if memo_key in candidates_memo:
+            self.memo_hits += 1
+        else:
+            candidates_memo[memo_key] = self._neighbour_candidates(
+                current_entities,
+                neighbours[key],
+                path_length < self.right_extensions,
+            )
+        right_candidates, left_candidates, child_candidates = candidates_memo[memo_key]
+
+        # Interned ids of every entity on the path so far.
+        all_entities_in_current_path = set()
+        for segment in current_path_segments:
+            all_entities_in_current_path.update(segment.source.key)
+            all_entities_in_current_path.update(segment.target.key)
+
+        for edge_uri, source_nodes in right_candidates:
+            if not source_nodes.key.isdisjoint(all_entities_in_current_path):
+                continue
+            new_path_segment = PathSegment(source_nodes, edge_uri, current_entities)
+            found_paths.append(current_path_segments + [new_path_segment])
 
-        while len(stack) != 0:
-            current_entities, current_path_segments, path_length = stack.pop(0)
+        for edge_uri, target_nodes in left_candidates:
+            if not target_nodes.key.isdisjoint(all_entities_in_current_path):
+                continue
+            new_path_segment = PathSegment(current_entities, edge_uri, target_nodes)
+            found_paths.append(current_path_segments + [new_path_segment])
 
-            if path_length >= self.path_length:
+        children = []
+        for edge_uri, target_nodes in child_candidates:
+            if not target_nodes.key.isdisjoint(all_entities_in_current_path):
                 continue
+            new_path_segment = PathSegment(current_entities, edge_uri, target_nodes)
+            children.append(
+                (
+                    target_nodes,
+                    current_path_segments + [new_path_segment],
+                    path_length + 1,
+                )
+            )
+        return children
 
-            all_entities_in_current_path = set()
-            for seg_source_nodes, _, seg_target_nodes in current_path_segments:
-                all_entities_in_current_path.update(seg_source_nodes)
-                all_entities_in_current_path.update(seg_target_nodes)
+    def _expand_levels(self, start_entities, executor):
+        # Breadth-first, one depth level at a time: the neighbour queries of a
+        # level run concurrently, then its paths are processed in FIFO order
+        # so found_paths comes out exactly as with a queue-based search.
+        found_paths = []
+        frontier = [(EntityGroup(start_entities), [], 0)]
+        # (entity set, remaining depth) -> candidates; only the cycle check
+        # against each path prefix is repeated for an entity set seen before.
+        neighbours, candidates_memo = self._exploration_tables()
 
-            if path_length < self.right_extensions:
-                resolved_right_segments = self.get_right_neighbours_of_entities(
-                    current_entities
+        while frontier:
+            frontier = [entry for entry in frontier if entry[2] < self.path_length]
+            if not frontier or self._budget_exhausted(found_paths):
+                break
+            self._fetch_frontier(frontier, executor, neighbours)
+            next_frontier = []
+            for entry in frontier:
+                if not self._has_neighbours(entry, neighbours):
+                    continue
+                next_frontier.extend(
+                    self._expand_entry(entry, neighbours, candidates_memo, found_paths)
                 )
-                for source_nodes, edge_uri, target_nodes in resolved_right_segments:
-                    if (
-                        any(n in all_entities_in_current_path for n in source_nodes)
-                        or len(source_nodes) >= self.max_entities_in_path_node
-                    ):
-                        continue
-                    new_path_segment = (source_nodes, edge_uri, target_nodes)
-                    found_paths.append(current_path_segments + [new_path_segment])
+            frontier = next_frontier
+        return found_paths
 
-            resolved_left_segments, expandable_left_triplets = (
-                self.get_left_neighbours_of_entities(current_entities)
+    def _expansion_score(self, entry):
+        # Lower is better: small entity sets first, i.e. entries reached over
+        # the more selective edges, and among equal sizes the shallower ones.
+        current_entities, _, path_length = entry
+        return len(current_entities), path_length
+
+    def _expand_best_first(self, start_entities, executor):
+        # Anytime search: the best-scored entries are expanded first, up to
+        # max_workers at a time, until the queue is empty or a budget runs out.
+        found_paths = []
+        neighbours, candidates_memo = self._exploration_tables()
+        tie_breaker = itertools.count()
+        start_entry = (EntityGroup(start_entities), [], 0)
+        queue = []
+        if self.path_length > 0:
+            queue.append(
+                (self._expansion_score(start_entry), next(tie_breaker), start_entry)
             )
 
-            for source_nodes, edge_uri, target_nodes in resolved_left_segments:
-                if (
-                    any(n in all_entities_in_current_path for n in target_nodes)
-                    or len(target_nodes) >= self.max_entities_in_path_node
-                ):
+        while queue and not self._budget_exhausted(found_paths):
+            batch = [
+                heapq.heappop(queue)[2]
+                for _ in range(min(max(self.max_workers, 1), len(queue)))
+            ]
+            self._fetch_frontier(batch, executor, neighbours)
+            for entry in batch:
+                if not self._has_neighbours(entry, neighbours):
                     continue
-                new_path_segment = (source_nodes, edge_uri, target_nodes)
-                found_paths.append(current_path_segments + [new_path_segment])
-
-            expandable_edges_map = {}
-            for e1, edge, e2 in expandable_left_triplets:
-                if edge not in expandable_edges_map:
-                    expandable_edges_map[edge] = []
-                if e2 not in expandable_edges_map[edge]:
-                    expandable_edges_map[edge].append(e2)
-
-            for edge_uri, target_nodes_list in expandable_edges_map.items():
-                unique_target_nodes = list(set(target_nodes_list))
-                if (
-                    any(n in all_entities_in_current_path for n in unique_target_nodes)
-                    or len(unique_target_nodes) == 0
-                    or len(unique_target_nodes) >= self.max_entities_in_path_node
+                for child in self._expand_entry(
+                    entry, neighbours, candidates_memo, found_paths
                 ):
-                    continue
-                new_path_segment = (current_entities, edge_uri, unique_target_nodes)
-                stack.append(
-                    (
-                        list(unique_target_nodes),
-                        current_path_segments + [new_path_segment],
-                        path_length + 1,
-                    )
-                )
+                    if child[2] < self.path_length:
+                        heapq.heappush(
+                            queue,
+                            (self._expansion_score(child), next(tie_breaker), child),
+                        )
         return found_paths
 
     def sort_edge_triplet(self, triplet):
@@ -1,6 +1,9 @@
 import argparse
 from pathlib import Path
 from sparql_wrapper import SPARQLWrapperCache
+from query_cache import PersistentQueryCache
+from sparql_errors import SPARQLEndpointError
+from exploration_artifacts import ExplorationArtifactStore
 from set_extension import CompositeGraphBasedSetExtension
 from experiment_runner import ExperimentRunner
 from visualization_manager import VisualizationManager
@@ -9,12 +12,43 @@ from config import (
     DEFAULT_GRAPH,
     DEFAULT_TIMEOUT,
     DEFAULT_FILTER_PATTERN,
+    DEFAULT_CACHE_PATH,
+    DEFAULT_CACHE_TTL_SECONDS,
+    DEFAULT_CACHE_MAX_ENTRIES,
+    DEFAULT_CACHE_MAX_BYTES,
+    DEFAULT_EXPLORATION_MODE,
+    DEFAULT_EDGE_FILTER_MODE,
+    DEFAULT_ARTIFACT_DIR,
+    DEFAULT_OPTIMIZE_QUERIES,
+    DEFAULT_USE_PREFIXED_NAMES,
 )
 
 
-def run_simple_expansion_example(output_base_dir="output", visualize=False):
+def run_simple_expansion_example(
+    output_base_dir="output",
+    visualize=False,
+    cache_path=DEFAULT_CACHE_PATH,
+    exploration_mode=DEFAULT_EXPLORATION_MODE,
+    edge_filter_mode=DEFAULT_EDGE_FILTER_MODE,
+    artifact_dir=DEFAULT_ARTIFACT_DIR,
+    optimize_queries=DEFAULT_OPTIMIZE_QUERIES,
+    use_prefixed_names=DEFAULT_USE_PREFIXED_NAMES,
+):
     print("Running a simple entity expansion example...")
-    sparql = SPARQLWrapperCache(DEFAULT_SPARQL_ENDPOINT, DEFAULT_GRAPH, DEFAULT_TIMEOUT)
+    persistent_cache = None
+    if cache_path:
+        persistent_cache = PersistentQueryCache(
+            cache_path,
+            ttl_seconds=DEFAULT_CACHE_TTL_SECONDS,
+            max_entries=DEFAULT_CACHE_MAX_ENTRIES,
+            max_bytes=DEFAULT_CACHE_MAX_BYTES,
+        )
+    sparql = SPARQLWrapperCache(
+        DEFAULT_SPARQL_ENDPOINT,
+        DEFAULT_GRAPH,
+        DEFAULT_TIMEOUT,
+        persistent_cache=persistent_cache,
+    )
     model = CompositeGraphBasedSetExtension(
         sparql,
         path_length=3,
@@ -22,6 +56,11 @@ def run_simple_expansion_example(output_base_dir="output", visualize=False):
         filter_pattern=DEFAULT_FILTER_PATTERN,
         min_entities_for_values_clause=2,
         max_entities_in_path_node=5,
+        exploration_mode=exploration_mode,
+        edge_filter_mode=edge_filter_mode,
+        artifact_store=ExplorationArtifactStore(artifact_dir) if artifact_dir else None,
+        optimize_queries=optimize_queries,
+        use_prefixed_names=use_prefixed_names,
     )
     seed_entities = [
         "http://dbpedia.org/resource/Budapest",
@@ -29,7 +68,14 @@ def run_simple_expansion_example(output_base_dir="output", visualize=False):
         "http://dbpedia.org/resource/Mátraverebély",
     ]
     print(f"Seed entities: {seed_entities}")
-    expanded_entities, generated_query, paths_for_viz = model.get_results(seed_entities)
+    try:
+        expanded_entities, generated_query, paths_for_viz = model.get_results(
+            seed_entities
+        )
+    except SPARQLEndpointError as e:
+        print(f"Entity set expansion aborted, the SPARQL endpoint failed: {e}")
+        sparql.report_cache_stats()
+        return
 
     print("\nGenerated SPARQL Query:")
     print(generated_query)
@@ -38,6 +84,7 @@ def run_simple_expansion_example(output_base_dir="output", visualize=False):
         print(f"- {entity}")
     if len(expanded_entities) > 10:
         print("  ... and more.")
+    sparql.report_cache_stats()
 
     if visualize:
         print(f"\nGenerating visualizations in base directory: {output_base_dir}")
@@ -64,6 +111,12 @@ def run_full_experiments(
     num_seed_entities,
     max_queries,
     create_visualizations,
+    cache_path=DEFAULT_CACHE_PATH,
+    exploration_mode=DEFAULT_EXPLORATION_MODE,
+    edge_filter_mode=DEFAULT_EDGE_FILTER_MODE,
+    artifact_dir=DEFAULT_ARTIFACT_DIR,
+    optimize_queries=DEFAULT_OPTIMIZE_QUERIES,
+    use_prefixed_names=DEFAULT_USE_PREFIXED_NAMES,
 ):
     print(
         f"Starting full experiments. Database: {database_file}, Output base: {output_base_dir}"
@@ -76,6 +129,12 @@ def run_full_experiments(
         database_path=database_file,
         output_dir=output_base_dir,
         visualize=create_visualizations,
+        cache_path=cache_path,
+        exploration_mode=exploration_mode,
+        edge_filter_mode=edge_filter_mode,
+        artifact_dir=artifact_dir,
+        optimize_queries=optimize_queries,
+        use_prefixed_names=use_prefixed_names,
     )
     runner.run_all_experiments(
         template_ids_list=template_ids_list,
@@ -91,6 +150,7 @@ def run_full_experiments(
         print(f"  Total Queries Evaluated: {overall_metrics['count']}")
     else:
         print("  No queries were successfully processed to calculate overall metrics.")
+    runner.sparql_wrapper.report_cache_stats()
 
     saved_results_path = runner.save_results(filename="all_experiment_results.json")
     print(
@@ -141,13 +201,57 @@ if __name__ == "__main__":
         action="store_true",
         help="Enable generation of visualizations for experiments and examples.",
     )
+    parser.add_argument(
+        "--cache_path",
+        type=str,
+        default=DEFAULT_CACHE_PATH,
+        help="SQLite file for the persistent SPARQL result cache. Default: disabled",
+    )
+    parser.add_argument(
+        "--exploration_mode",
+        choices=["server", "adjacency"],
+        default=DEFAULT_EXPLORATION_MODE,
+        help="Compute shared neighbours with server-side aggregation queries or locally from cached per-entity adjacency. Default: server",
+    )
+    parser.add_argument(
+        "--edge_filter_mode",
+        choices=["regex", "index", "client"],
+        default=DEFAULT_EDGE_FILTER_MODE,
+        help="Exclude filtered edges with a regex on the endpoint, with a cached predicate index, or on the client. Default: regex",
+    )
+
+    parser.add_argument(
+        "--artifact_dir",
+        type=str,
+        default=DEFAULT_ARTIFACT_DIR,
+        help="Directory of stored exploration paths reused when only query generation changes. Default: disabled",
+    )
+    parser.add_argument(
+        "--optimize_queries",
+        action="store_true",
+        default=DEFAULT_OPTIMIZE_QUERIES,
+        help="Drop implied triple patterns from generated queries and order the rest by predicate selectivity.",
+    )
+    parser.add_argument(
+        "--prefixed_names",
+        action="store_true",
+        default=DEFAULT_USE_PREFIXED_NAMES,
+        help="Write IRIs in generated queries as prefixed names to keep them short.",
+    )
 
     args = parser.parse_args()
     Path(args.output_dir).mkdir(parents=True, exist_ok=True)
 
     if args.example:
         run_simple_expansion_example(
-            output_base_dir=args.output_dir, visualize=args.visualize
+            output_base_dir=args.output_dir,
+            visualize=args.visualize,
+            cache_path=args.cache_path,
+            exploration_mode=args.exploration_mode,
+            edge_filter_mode=args.edge_filter_mode,
+            artifact_dir=args.artifact_dir,
+            optimize_queries=args.optimize_queries,
+            use_prefixed_names=args.prefixed_names,
         )
     elif args.database:
         run_full_experiments(
@@ -157,6 +261,12 @@ if __name__ == "__main__":
             num_seed_entities=args.seeds,
             max_queries=args.max_queries,
             create_visualizations=args.visualize,
+            cache_path=args.cache_path,
+            exploration_mode=args.exploration_mode,
+            edge_filter_mode=args.edge_filter_mode,
+            artifact_dir=args.artifact_dir,
+            optimize_queries=args.optimize_queries,
+            use_prefixed_names=args.prefixed_names,
         )
     else:
         print("Please specify either --example or --database <path_to_db.json> to run.")
@@ -0,0 +1,109 @@
+import threading
+
+
+class URIInterner:
+    def __init__(self):
+        self._ids = {}
+        self._uris = []
+        self._lock = threading.Lock()
+
+    def intern(self, uri):
+        uri_id = self._ids.get(uri)
+        if uri_id is None:
+            with self._lock:
+                uri_id = self._ids.setdefault(uri, len(self._uris))
+                if uri_id == len(self._uris):
+                    self._uris.append(uri)
+        return uri_id
+
+    def lookup(self, uri):
+        return self._ids.get(uri)
+
+    def uri(self, uri_id):
+        return self._uris[uri_id]
+
+    def __len__(self):
+        return len(self._uris)
+
+
+class EntityGroup:
+    # An immutable group of entity URIs on one side of a path segment. It
+    # behaves like the list it replaces, and `key` identifies the group
+    # independently of the order of its URIs. The key holds the group's own
+    # URI strings, so nothing outlives the groups of a run.
+    __slots__ = ("uris", "key", "_sorted_uris")
+
+    def __init__(self, uris):
+        self.uris = tuple(uris)
+        self.key = frozenset(self.uris)
+        self._sorted_uris = None
+
+    @classmethod
+    def of(cls, nodes):
+        return nodes if isinstance(nodes, cls) else cls(nodes)
+
+    def sorted_uris(self):
+        if self._sorted_uris is None:
+            self._sorted_uris = tuple(sorted(self.uris))
+        return self._sorted_uris
+
+    def __iter__(self):
+        return iter(self.uris)
+
+    def __len__(self):
+        return len(self.uris)
+
+    def __getitem__(self, index):
+        return self.uris[index]
+
+    def __contains__(self, uri):
+        return uri in self.uris
+
+    def __eq__(self, other):
+        if isinstance(other, EntityGroup):
+            return self.uris == other.uris
+        if isinstance(other, (list, tuple)):
+            return self.uris == tuple(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return repr(list(self.uris))
+
+
+class PathSegment:
+    # (source, edge, target) record that unpacks like the tuple it replaces.
+    __slots__ = ("source", "edge", "target")
+
+    def __init__(self, source, edge, target):
+        self.source = source
+        self.edge = edge
+        self.target = target
+
+    def __iter__(self):
+        yield self.source
+        yield self.edge
+        yield self.target
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, index):
+        return (self.source, self.edge, self.target)[index]
+
+    def __eq__(self, other):
+        if isinstance(other, (PathSegment, tuple)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.source, self.edge, self.target))
+
+    def __repr__(self):
+        return repr(tuple(self))
+
+
+def entity_group_key(nodes):
+    return EntityGroup.of(nodes).key
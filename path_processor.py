@@ -1,34 +1,41 @@
 import ast
 
+from path_model import entity_group_key
+from prefixed_names import prefixed_name, uri_namespace
+from config import DEFAULT_USE_PREFIXED_NAMES
+
 
 class PathProcessor:
-    def __init__(self, min_entities_for_values_clause=3, max_entities_in_path_node=5):
+    def __init__(
+        self,
+        min_entities_for_values_clause=3,
+        max_entities_in_path_node=5,
+        use_prefixed_names=DEFAULT_USE_PREFIXED_NAMES,
+    ):
         self.min_entities_for_values_clause = min_entities_for_values_clause
         self.max_entities_in_path_node = max_entities_in_path_node
+        self.use_prefixed_names = use_prefixed_names
 
-    def get_variable_for_entity_group(self, entity_group_str, entity_to_variable_map):
-        if entity_group_str not in entity_to_variable_map:
-            entity_to_variable_map[entity_group_str] = "?e" + str(
+    def get_variable_for_entity_group(self, entity_group_key, entity_to_variable_map):
+        if entity_group_key not in entity_to_variable_map:
+            entity_to_variable_map[entity_group_key] = "?e" + str(
                 len(entity_to_variable_map)
             )
-        return entity_to_variable_map[entity_group_str]
+        return entity_to_variable_map[entity_group_key]
 
     def get_variable_path_representation(
-        self, path_segments, entity_to_variable_map, start_entities_str_repr
+        self, path_segments, entity_to_variable_map, start_entities_key
     ):
         variable_path = []
-        if start_entities_str_repr not in entity_to_variable_map:
-            entity_to_variable_map[start_entities_str_repr] = "?e"
+        if start_entities_key not in entity_to_variable_map:
+            entity_to_variable_map[start_entities_key] = "?e"
 
         for source_nodes, edge_uri, target_nodes in path_segments:
-            source_nodes_str = str(sorted(list(source_nodes)))
-            target_nodes_str = str(sorted(list(target_nodes)))
-
             var_source = self.get_variable_for_entity_group(
-                source_nodes_str, entity_to_variable_map
+                entity_group_key(source_nodes), entity_to_variable_map
             )
             var_target = self.get_variable_for_entity_group(
-                target_nodes_str, entity_to_variable_map
+                entity_group_key(target_nodes), entity_to_variable_map
             )
             variable_path.append(
                 ((source_nodes, var_source), edge_uri, (target_nodes, var_target))
@@ -37,14 +44,14 @@ class PathProcessor:
 
     def get_all_variable_paths(self, all_paths, start_entities):
         entity_to_variable_map = {}
-        start_entities_str_repr = str(sorted(list(start_entities)))
-        entity_to_variable_map[start_entities_str_repr] = "?e"
+        start_entities_key = entity_group_key(start_entities)
+        entity_to_variable_map[start_entities_key] = "?e"
 
         all_variable_paths_repr = []
         for path_segments in all_paths:
             all_variable_paths_repr.append(
                 self.get_variable_path_representation(
-                    path_segments, entity_to_variable_map, start_entities_str_repr
+                    path_segments, entity_to_variable_map, start_entities_key
                 )
             )
         return all_variable_paths_repr, entity_to_variable_map
@@ -58,22 +65,13 @@ class PathProcessor:
         return res + ":"
 
     def get_uri_namespace_prefix(self, url):
-        if "http" not in str(url):
-            return ""
-        parts = str(url).split("/")
-        if len(parts) < 2:
-            return ""
-
-        last_part = parts[-1]
-        if "#" in last_part:
-            return "/".join(parts[:-1]) + "/" + last_part.split("#")[0] + "#"
-        else:
-            if last_part:
-                return "/".join(parts[:-1]) + "/"
-            return str(url)
+        return uri_namespace(url)
 
     def get_optimal_prefixes_for_all_paths(self, all_variable_paths):
         defined_prefixes = {"": ""}
+        # The same entity groups recur across paths, so each URI is looked at
+        # only once.
+        seen_uris = set()
         for var_path in all_variable_paths:
             for (
                 (original_source_nodes, _),
@@ -85,6 +83,9 @@ class PathProcessor:
                 uris_to_prefix.extend(original_target_nodes)
 
                 for uri in uris_to_prefix:
+                    if uri in seen_uris:
+                        continue
+                    seen_uris.add(uri)
                     namespace = self.get_uri_namespace_prefix(uri)
                     if namespace and namespace not in defined_prefixes:
                         defined_prefixes[namespace] = (
@@ -94,44 +95,11 @@ class PathProcessor:
                         )
         return defined_prefixes
 
-    # def get_prefixed_uri_or_variable(self, item, defined_prefixes):
-    #     if isinstance(item, str) and item.startswith("?"):
-    #         return item
-
-    #     uri = str(item)
-    #     namespace = self.get_uri_namespace_prefix(uri)
-    #     if namespace and namespace in defined_prefixes and defined_prefixes[namespace]:
-    #         local_name = uri.replace(namespace, "")
-    #         # Add check for ANY special characters that would cause SPARQL syntax issues
-    #         if (
-    #             local_name
-    #             and not local_name[0] in ".-0123456789"
-    #             and not any(
-    #                 c in local_name
-    #                 for c in [
-    #                     "(",
-    #                     "+",
-    #                     ")",
-    #                     ",",
-    #                     "'",
-    #                     " ",
-    #                     "/",
-    #                     "&",
-    #                     "=",
-    #                     "?",
-    #                     "#",
-    #                     "%",
-    #                     "$",
-    #                     "@",
-    #                 ]
-    #             )
-    #         ):
-    #             return defined_prefixes[namespace] + local_name
-    #     return "<" + uri + ">"
-
     def get_prefixed_uri_or_variable(self, item, defined_prefixes):
         if isinstance(item, str) and item.startswith("?"):
             return item
+        if self.use_prefixed_names:
+            return prefixed_name(item, defined_prefixes)
         # Use angle brackets for all URIs to avoid SPARQL syntax issues
         return "<" + str(item) + ">"
 
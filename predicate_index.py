@@ -0,0 +1,112 @@
+import json
+import os
+import re
+import threading
+import time
+
+from sparql_results import iter_result_rows
+from config import (
+    DEFAULT_EXPLORER_RESULT_FORMAT,
+    DEFAULT_PREDICATE_INDEX_PATH,
+    DEFAULT_PREDICATE_INDEX_TTL_SECONDS,
+    DEFAULT_PREDICATE_INDEX_MAX_TERMS,
+)
+
+PREDICATE_VOCABULARY_QUERY = """SELECT DISTINCT ?edge
+                WHERE {
+                    ?subject ?edge ?object .
+                }"""
+
+
+class PredicateIndex:
+    # Resolves edge filter patterns against the endpoint's predicate vocabulary
+    # so queries can test ?edge against explicit IRIs instead of running a
+    # regex on every candidate triple. The vocabulary is kept on disk.
+    def __init__(
+        self,
+        sparql_wrapper,
+        path=DEFAULT_PREDICATE_INDEX_PATH,
+        ttl_seconds=DEFAULT_PREDICATE_INDEX_TTL_SECONDS,
+        result_format=DEFAULT_EXPLORER_RESULT_FORMAT,
+        max_terms=DEFAULT_PREDICATE_INDEX_MAX_TERMS,
+    ):
+        self.sparql = sparql_wrapper
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.result_format = result_format
+        self.max_terms = max_terms
+        self._predicates = None
+        self._partitions = {}
+        self._lock = threading.Lock()
+
+    def _vocabulary_key(self):
+        return f"{self.sparql.endpoint} {self.sparql.default_graph or ''}"
+
+    def _read_index_file(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable predicate index {self.path}: {e}")
+            return {}
+
+    def _write_index_file(self, predicates):
+        index = self._read_index_file()
+        index[self._vocabulary_key()] = {
+            "created": time.time(),
+            "predicates": predicates,
+        }
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(temporary_path, self.path)
+
+    def predicates(self):
+        with self._lock:
+            if self._predicates is not None:
+                return self._predicates
+            entry = self._read_index_file().get(self._vocabulary_key())
+            if entry and time.time() - entry["created"] < self.ttl_seconds:
+                self._predicates = entry["predicates"]
+                return self._predicates
+            self._predicates = sorted(
+                edge
+                for (edge,) in iter_result_rows(
+                    self.sparql,
+                    PREDICATE_VOCABULARY_QUERY,
+                    ("edge",),
+                    self.result_format,
+                )
+                if edge
+            )
+            if self.path:
+                self._write_index_file(self._predicates)
+            return self._predicates
+
+    def partition(self, filter_pattern):
+        if filter_pattern not in self._partitions:
+            compiled_pattern = re.compile(filter_pattern)
+            excluded, allowed = [], []
+            for predicate in self.predicates():
+                if compiled_pattern.search(predicate):
+                    excluded.append(predicate)
+                else:
+                    allowed.append(predicate)
+            self._partitions[filter_pattern] = (excluded, allowed)
+        return self._partitions[filter_pattern]
+
+    def filter_expression(self, filter_pattern, variable="?edge"):
+        # Uses whichever of the allow and deny lists is shorter; None when both
+        # exceed max_terms and the regex is the cheaper filter.
+        excluded, allowed = self.partition(filter_pattern)
+        if not excluded:
+            return "true"
+        if min(len(excluded), len(allowed)) > self.max_terms:
+            return None
+        if len(allowed) < len(excluded):
+            iris = ", ".join("<" + predicate + ">" for predicate in allowed)
+            return f"{variable} IN ({iris})"
+        iris = ", ".join("<" + predicate + ">" for predicate in excluded)
+        return f"{variable} NOT IN ({iris})"
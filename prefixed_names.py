@@ -0,0 +1,123 @@
+# Serializes IRIs as SPARQL 1.1 prefixed names (PNAME_LN). Local name
+# characters that the grammar only allows escaped get a backslash when
+# allow_escapes is on; otherwise, and for IRIs whose local name cannot be
+# written as a PN_LOCAL at all, they stay full <...> IRIs.
+from config import DEFAULT_ESCAPE_LOCAL_NAMES
+
+# PN_LOCAL_ESC: characters that may appear in a local name after a backslash.
+PN_LOCAL_ESCAPED_CHARACTERS = frozenset("_~.-!$&'()*+,;=/?#@%")
+
+# PN_CHARS_BASE without the ASCII letters.
+PN_CHARS_BASE_RANGES = (
+    (0x00C0, 0x00D6),
+    (0x00D8, 0x00F6),
+    (0x00F8, 0x02FF),
+    (0x0370, 0x037D),
+    (0x037F, 0x1FFF),
+    (0x200C, 0x200D),
+    (0x2070, 0x218F),
+    (0x2C00, 0x2FEF),
+    (0x3001, 0xD7FF),
+    (0xF900, 0xFDCF),
+    (0xFDF0, 0xFFFD),
+    (0x10000, 0xEFFFF),
+)
+
+HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+
+
+def _is_pn_chars_u(character):
+    if character == "_" or "a" <= character <= "z" or "A" <= character <= "Z":
+        return True
+    code_point = ord(character)
+    return any(low <= code_point <= high for low, high in PN_CHARS_BASE_RANGES)
+
+
+def _is_pn_chars(character):
+    code_point = ord(character)
+    return (
+        _is_pn_chars_u(character)
+        or character == "-"
+        or "0" <= character <= "9"
+        or code_point == 0x00B7
+        or 0x0300 <= code_point <= 0x036F
+        or 0x203F <= code_point <= 0x2040
+    )
+
+
+def escape_local_name(local_name, allow_escapes=True):
+    # Returns local_name written as a PN_LOCAL, or None when it contains a
+    # character that no PN_LOCAL can express (or that needs a backslash
+    # escape when allow_escapes is off).
+    escaped = []
+    last_index = len(local_name) - 1
+    for index, character in enumerate(local_name):
+        if (
+            character == "%"
+            and len(local_name) > index + 2
+            and local_name[index + 1] in HEX_DIGITS
+            and local_name[index + 2] in HEX_DIGITS
+        ):
+            # A percent-encoded octet is kept as it is (PERCENT).
+            escaped.append(character)
+        elif _is_pn_chars_u(character) or character == ":" or "0" <= character <= "9":
+            escaped.append(character)
+        elif _is_pn_chars(character) and index > 0:
+            escaped.append(character)
+        elif character == "." and 0 < index < last_index:
+            escaped.append(character)
+        elif allow_escapes and character in PN_LOCAL_ESCAPED_CHARACTERS:
+            escaped.append("\\" + character)
+        else:
+            return None
+    return "".join(escaped)
+
+
+def unescape_local_name(local_name):
+    characters = []
+    escaped = False
+    for character in local_name:
+        if character == "\\" and not escaped:
+            escaped = True
+            continue
+        characters.append(character)
+        escaped = False
+    return "".join(characters)
+
+
+def uri_namespace(url):
+    if "http" not in str(url):
+        return ""
+    parts = str(url).split("/")
+    if len(parts) < 2:
+        return ""
+
+    last_part = parts[-1]
+    if "#" in last_part:
+        return "/".join(parts[:-1]) + "/" + last_part.split("#")[0] + "#"
+    else:
+        if last_part:
+            return "/".join(parts[:-1]) + "/"
+        return str(url)
+
+
+def prefixed_name(uri, defined_prefixes, allow_escapes=DEFAULT_ESCAPE_LOCAL_NAMES):
+    uri = str(uri)
+    namespace = uri_namespace(uri)
+    prefix = defined_prefixes.get(namespace)
+    if prefix and uri.startswith(namespace):
+        local_name = escape_local_name(uri[len(namespace) :], allow_escapes)
+        if local_name is not None:
+            return prefix + local_name
+    return "<" + uri + ">"
+
+
+def expand_prefixed_name(term, defined_prefixes):
+    # Inverse of prefixed_name for terms of a generated query; variables and
+    # full IRIs are returned unchanged.
+    if term.startswith(("<", "?")):
+        return term
+    for namespace, prefix in defined_prefixes.items():
+        if prefix and term.startswith(prefix):
+            return "<" + namespace + unescape_local_name(term[len(prefix) :]) + ">"
+    return term
@@ -0,0 +1,257 @@
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+def estimate_result_size(value):
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += estimate_result_size(key) + estimate_result_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += estimate_result_size(item)
+    return size
+
+
+class MemoryQueryCache:
+    EVICTION_POLICIES = ("lru", "lfu")
+
+    def __init__(self, max_bytes=None, policy="lru"):
+        if policy not in self.EVICTION_POLICIES:
+            raise ValueError(
+                f"Unknown eviction policy '{policy}', expected one of {self.EVICTION_POLICIES}"
+            )
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.resident_bytes = 0
+        self.evictions = 0
+        self.rejected = 0
+        # Ordered from least to most recently used.
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._frequencies = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            self._frequencies[key] += 1
+            return self._entries[key]
+
+    def set(self, key, value):
+        size = estimate_result_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                self.rejected += 1
+                return False
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._frequencies[key] = 1
+            self.resident_bytes += size
+            while self.max_bytes is not None and self.resident_bytes > self.max_bytes:
+                self._remove(self._select_victim(exclude=key))
+                self.evictions += 1
+            return True
+
+    def _select_victim(self, exclude):
+        candidates = (key for key in self._entries if key != exclude)
+        if self.policy == "lfu":
+            # min() keeps the first of equally frequent keys, i.e. the LRU one.
+            return min(candidates, key=self._frequencies.__getitem__)
+        return next(candidates)
+
+    def _remove(self, key):
+        del self._entries[key]
+        self.resident_bytes -= self._sizes.pop(key)
+        del self._frequencies[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._frequencies.clear()
+            self.resident_bytes = 0
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "resident_bytes": self.resident_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "rejected": self.rejected,
+            "policy": self.policy,
+        }
+
+
+class PersistentQueryCache:
+    def __init__(self, path, ttl_seconds=None, max_entries=None, max_bytes=None):
+        self.path = str(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._create_schema()
+
+    @staticmethod
+    def make_key(endpoint, default_graph, query):
+        key_source = f"{endpoint}\n{default_graph or ''}\n{query}"
+        return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; writes that must be atomic use explicit
+            # BEGIN IMMEDIATE so several processes can share one file.
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self):
+        conn = self._connect()
+        conn.execute("""CREATE TABLE IF NOT EXISTS query_results (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL,
+                payload BLOB NOT NULL
+            )""")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_query_results_last_access "
+            "ON query_results (last_access)"
+        )
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT created, payload FROM query_results WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+
+        created, payload = row
+        now = time.time()
+        if self.ttl_seconds is not None and now - created > self.ttl_seconds:
+            conn.execute("DELETE FROM query_results WHERE key = ?", (key,))
+            self._count("expired")
+            self._count("misses")
+            return None
+
+        conn.execute(
+            "UPDATE query_results SET last_access = ? WHERE key = ?", (now, key)
+        )
+        self._count("hits")
+        return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+    def set(self, key, value, endpoint=None):
+        payload = zlib.compress(
+            json.dumps(value, separators=(",", ":")).encode("utf-8")
+        )
+        if self.max_bytes is not None and len(payload) > self.max_bytes:
+            return
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO query_results "
+                "(key, endpoint, created, last_access, size, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, now, now, len(payload), payload),
+            )
+            self._evict_locked(conn, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict_locked(self, conn, now):
+        if self.ttl_seconds is not None:
+            deleted = conn.execute(
+                "DELETE FROM query_results WHERE created < ?",
+                (now - self.ttl_seconds,),
+            ).rowcount
+            with self._stats_lock:
+                self.expired += max(deleted, 0)
+
+        if self.max_entries is None and self.max_bytes is None:
+            return
+        entries, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM query_results"
+        ).fetchone()
+        if (self.max_entries is None or entries <= self.max_entries) and (
+            self.max_bytes is None or total_bytes <= self.max_bytes
+        ):
+            return
+
+        evicted_keys = []
+        for key, size in conn.execute(
+            "SELECT key, size FROM query_results ORDER BY last_access ASC"
+        ):
+            if (self.max_entries is None or entries <= self.max_entries) and (
+                self.max_bytes is None or total_bytes <= self.max_bytes
+            ):
+                break
+            evicted_keys.append((key,))
+            entries -= 1
+            total_bytes -= size
+        conn.executemany("DELETE FROM query_results WHERE key = ?", evicted_keys)
+        with self._stats_lock:
+            self.evictions += len(evicted_keys)
+
+    def clear(self):
+        self._connect().execute("DELETE FROM query_results")
+
+    def stats(self):
+        entries, total_bytes = (
+            self._connect()
+            .execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM query_results")
+            .fetchone()
+        )
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total_bytes,
+        }
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import threading
+
+from prefixed_names import expand_prefixed_name
+
+# Constants hidden by the structural fingerprint.
+CONSTANT_PLACEHOLDER = "<>"
+
+
+def _digest(value):
+    return hashlib.sha256(
+        json.dumps(value, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def _query_structure(query_triplets_map, defined_prefixes, values_clause_map):
+    # Patterns and VALUES sets with every IRI written in full, so prefix labels
+    # that differ from query to query do not matter.
+    patterns = {
+        tuple(
+            expand_prefixed_name(term, defined_prefixes)
+            for term in (subject, predicate, obj)
+        )
+        for subject, po_pairs in query_triplets_map.items()
+        for predicate, obj in po_pairs
+    }
+    values = {
+        var_for_pattern: tuple(
+            sorted(
+                expand_prefixed_name(uri, defined_prefixes)
+                for uri in uri_list_for_values
+            )
+        )
+        for var_for_pattern, uri_list_for_values in values_clause_map.values()
+        if var_for_pattern != "?e"  # The seed entities get no VALUES clause
+    }
+    return patterns, values
+
+
+def _canonicalize(patterns, values, abstract_constants):
+    # Renames the variables other than ?e by colour refinement: a variable is
+    # labelled by its VALUES set and, round by round, by the predicates and
+    # labels of its neighbours. Equal forms always mean equal queries up to
+    # variable renaming; ties left by the refinement can only cause misses.
+    def constant(term):
+        return CONSTANT_PLACEHOLDER if abstract_constants else term
+
+    variables = sorted(
+        {
+            term
+            for subject, _, obj in patterns
+            for term in (subject, obj)
+            if term.startswith("?") and term != "?e"
+        }
+    )
+    labels = {
+        variable: _digest(
+            len(values[variable])
+            if abstract_constants and variable in values
+            else values.get(variable, [])
+        )
+        for variable in variables
+    }
+
+    def term_label(term):
+        if term in labels:
+            return labels[term]
+        return term if term.startswith("?") else constant(term)
+
+    for _ in range(len(variables)):
+        refined_labels = {
+            variable: _digest(
+                [
+                    labels[variable],
+                    sorted(
+                        [predicate, term_label(obj)]
+                        for subject, predicate, obj in patterns
+                        if subject == variable
+                    ),
+                    sorted(
+                        [predicate, term_label(subject)]
+                        for subject, predicate, obj in patterns
+                        if obj == variable
+                    ),
+                ]
+            )
+            for variable in variables
+        }
+        stable = len(set(refined_labels.values())) == len(set(labels.values()))
+        labels = refined_labels
+        if stable:
+            break
+
+    renaming = {
+        variable: f"?v{index}"
+        for index, variable in enumerate(
+            sorted(variables, key=lambda variable: (labels[variable], variable))
+        )
+    }
+
+    def rename(term):
+        if term in renaming:
+            return renaming[term]
+        return term if term.startswith("?") else constant(term)
+
+    canonical_patterns = sorted(
+        [rename(subject), predicate, rename(obj)]
+        for subject, predicate, obj in patterns
+    )
+    canonical_values = sorted(
+        [renaming[variable], len(uris) if abstract_constants else list(uris)]
+        for variable, uris in values.items()
+        if variable in renaming
+    )
+    return [canonical_patterns, canonical_values]
+
+
+def canonical_query_key(query_triplets_map, defined_prefixes, values_clause_map):
+    # Equal for generated queries that only differ in variable names, pattern
+    # order and prefix labels.
+    patterns, values = _query_structure(
+        query_triplets_map, defined_prefixes, values_clause_map
+    )
+    return _digest(_canonicalize(patterns, values, abstract_constants=False))
+
+
+def structural_fingerprint(query_triplets_map, defined_prefixes, values_clause_map):
+    # Like canonical_query_key, but the entity constants and VALUES sets only
+    # count by position and size: queries of one template that differ only in
+    # their entities share a fingerprint.
+    patterns, values = _query_structure(
+        query_triplets_map, defined_prefixes, values_clause_map
+    )
+    return _digest(_canonicalize(patterns, values, abstract_constants=True))[:16]
+
+
+class CanonicalQueryCache:
+    # Expanded entities per canonical query key, shared by models so that
+    # logically identical generated queries run once.
+    def __init__(self):
+        self._results = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._results:
+                self.hits += 1
+                return list(self._results[key])
+            self.misses += 1
+            return None
+
+    def set(self, key, expanded_entities):
+        with self._lock:
+            self._results[key] = list(expanded_entities)
+
+    def __len__(self):
+        return len(self._results)
@@ -1,10 +1,22 @@
 import ast
 
+from path_model import entity_group_key
+from prefixed_names import prefixed_name
+from config import DEFAULT_USE_PREFIXED_NAMES
+
 
 class QueryGenerator:
-    def __init__(self, min_entities_for_values_clause=3, max_entities_in_path_node=5):
+    def __init__(
+        self,
+        min_entities_for_values_clause=3,
+        max_entities_in_path_node=5,
+        optimizer=None,
+        use_prefixed_names=DEFAULT_USE_PREFIXED_NAMES,
+    ):
         self.min_entities_for_values_clause = min_entities_for_values_clause
         self.max_entities_in_path_node = max_entities_in_path_node
+        self.optimizer = optimizer
+        self.use_prefixed_names = use_prefixed_names
 
     def _format_node_for_query(
         self, original_nodes_list, node_variable, defined_prefixes, values_clause_map
@@ -13,9 +25,9 @@ class QueryGenerator:
             len(original_nodes_list) >= self.min_entities_for_values_clause
             and len(original_nodes_list) <= self.max_entities_in_path_node
         ):
-            sorted_uris_str_key = str(sorted(list(original_nodes_list)))
-            if sorted_uris_str_key not in values_clause_map:
-                values_clause_map[sorted_uris_str_key] = (
+            nodes_key = entity_group_key(original_nodes_list)
+            if nodes_key not in values_clause_map:
+                values_clause_map[nodes_key] = (
                     node_variable,
                     [
                         self._get_prefixed_uri_for_values(uri, defined_prefixes)
@@ -30,48 +42,18 @@ class QueryGenerator:
         return node_variable
 
     def _get_prefixed_uri_for_values(self, uri, defined_prefixes):
+        if self.use_prefixed_names:
+            return prefixed_name(uri, defined_prefixes)
         return "<" + str(uri) + ">"
 
-    # def _get_prefixed_uri_for_values(self, uri, defined_prefixes):
-    #     namespace = "/".join(str(uri).split("/")[:-1]) + (
-    #         "/" + str(uri).split("/")[-1].split("#")[0] + "#"
-    #         if "#" in str(uri).split("/")[-1]
-    #         else "/"
-    #     )
-    #     if namespace in defined_prefixes and defined_prefixes[namespace]:
-    #         local_name = str(uri).replace(namespace, "")
-    #         # Add check for ANY special characters that would cause SPARQL syntax issues
-    #         if (
-    #             local_name
-    #             and not local_name[0] in ".-0123456789"
-    #             and not any(
-    #                 c in local_name
-    #                 for c in [
-    #                     "(",
-    #                     "+",
-    #                     ")",
-    #                     ",",
-    #                     "'",
-    #                     " ",
-    #                     "/",
-    #                     "&",
-    #                     "=",
-    #                     "?",
-    #                     "#",
-    #                     "%",
-    #                     "$",
-    #                     "@",
-    #                 ]
-    #             )
-    #         ):
-    #             return defined_prefixes[namespace] + local_name
-    #     return "<" + str(uri) + ">"
-
     def get_query_triplets_and_values(
         self, transformed_paths_for_query, defined_prefixes
     ):
         query_triplets_map = {}
         values_clause_map = {}
+        # Paths share most of their segments; a set keeps the duplicate check
+        # constant time instead of scanning each subject's pattern list.
+        seen_triplets = set()
 
         for var_path in transformed_paths_for_query:
             for (
@@ -94,9 +76,9 @@ class QueryGenerator:
 
                 if formatted_source not in query_triplets_map:
                     query_triplets_map[formatted_source] = []
-                if (prefixed_edge, formatted_target) not in query_triplets_map[
-                    formatted_source
-                ]:
+                triplet = (formatted_source, prefixed_edge, formatted_target)
+                if triplet not in seen_triplets:
+                    seen_triplets.add(triplet)
                     query_triplets_map[formatted_source].append(
                         (prefixed_edge, formatted_target)
                     )
@@ -105,6 +87,10 @@ class QueryGenerator:
     def create_query_from_processed_paths(
         self, query_triplets_map, defined_prefixes, values_clause_map
     ):
+        if self.use_prefixed_names:
+            defined_prefixes = self._used_prefixes(
+                query_triplets_map, defined_prefixes, values_clause_map
+            )
         prefix_declarations = "\n".join(
             [
                 f"PREFIX {defined_prefixes[ns]} <{ns}>"
@@ -112,18 +98,80 @@ class QueryGenerator:
                 if ns and defined_prefixes[ns]
             ]
         )
-        query_string = f"{prefix_declarations}\nSELECT DISTINCT ?e\nWHERE {{\n"
+        query_lines = [f"{prefix_declarations}\nSELECT DISTINCT ?e\nWHERE {{\n"]
+
+        if self.optimizer is not None:
+            query_lines.extend(
+                self._format_optimized_patterns(
+                    query_triplets_map, defined_prefixes, values_clause_map
+                )
+            )
+            query_lines.append("  FILTER (isURI(?e))\n}")
+            return "".join(query_lines)
 
         # Skip the VALUES clause for ?e (seed entities)
         for key, (var_for_pattern, uri_list_for_values) in values_clause_map.items():
             if var_for_pattern != "?e":  # Skip the seed entities
-                query_string += f"  VALUES {var_for_pattern} {{ {' '.join(uri_list_for_values)} }}\n"
+                query_lines.append(
+                    f"  VALUES {var_for_pattern} {{ {' '.join(uri_list_for_values)} }}\n"
+                )
 
         for subject_var, po_pairs in query_triplets_map.items():
             if not po_pairs:
                 continue
             patterns_str = " ;\n    ".join([f"{pred} {obj}" for pred, obj in po_pairs])
-            query_string += f"  {subject_var} {patterns_str} .\n"
+            query_lines.append(f"  {subject_var} {patterns_str} .\n")
 
-        query_string += "  FILTER (isURI(?e))\n}"
-        return query_string
+        query_lines.append("  FILTER (isURI(?e))\n}")
+        return "".join(query_lines)
+
+    def _format_optimized_patterns(
+        self, query_triplets_map, defined_prefixes, values_clause_map
+    ):
+        # Each VALUES clause goes right before the first pattern that uses its
+        # variable, and consecutive patterns of one subject share a line.
+        values_by_variable = {
+            var_for_pattern: uri_list_for_values
+            for var_for_pattern, uri_list_for_values in values_clause_map.values()
+            if var_for_pattern != "?e"  # Skip the seed entities
+        }
+        pattern_lines = []
+        previous_subject = None
+        for subject, pred, obj in self.optimizer.optimize(
+            query_triplets_map, defined_prefixes, values_clause_map
+        ):
+            for term in (subject, obj):
+                if term in values_by_variable:
+                    uri_list_for_values = values_by_variable.pop(term)
+                    pattern_lines.append(
+                        f"  VALUES {term} {{ {' '.join(uri_list_for_values)} }}\n"
+                    )
+                    previous_subject = None
+            if subject == previous_subject:
+                pattern_lines[-1] = pattern_lines[-1][: -len(" .\n")]
+                pattern_lines[-1] += f" ;\n    {pred} {obj} .\n"
+            else:
+                pattern_lines.append(f"  {subject} {pred} {obj} .\n")
+            previous_subject = subject
+        return pattern_lines
+
+    def _used_prefixes(self, query_triplets_map, defined_prefixes, values_clause_map):
+        # Only the prefixes of terms written as prefixed names are declared.
+        terms = []
+        for subject, po_pairs in query_triplets_map.items():
+            terms.append(subject)
+            for pred, obj in po_pairs:
+                terms.extend((pred, obj))
+        for var_for_pattern, uri_list_for_values in values_clause_map.values():
+            if var_for_pattern != "?e":  # Skip the seed entities
+                terms.extend(uri_list_for_values)
+        used_labels = {
+            term[: term.index(":") + 1]
+            for term in terms
+            if not term.startswith(("<", "?")) and ":" in term
+        }
+        return {
+            namespace: prefix
+            for namespace, prefix in defined_prefixes.items()
+            if prefix in used_labels
+        }
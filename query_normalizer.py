@@ -0,0 +1,99 @@
+import re
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<iri><[^<>"{}|^`\\\s]*>)
+  | (?P<string>\"\"\"(?:[^"\\]|\\.|"(?!""))*\"\"\"
+              |'''(?:[^'\\]|\\.|'(?!''))*'''
+              |"(?:[^"\\\n]|\\.)*"
+              |'(?:[^'\\\n]|\\.)*')
+  | (?P<comment>\#[^\n]*)
+  | (?P<space>\s+)
+  | (?P<punct>[{}(),;])
+  | (?P<word>(?:[^\s<>"'#{}(),;\\]|\\.)+|[<>"'\\])
+    """,
+    re.VERBOSE,
+)
+
+
+def tokenize_query(query):
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(query):
+        if match.lastgroup in ("space", "comment"):
+            continue
+        tokens.append(match.group())
+    return tokens
+
+
+def _read_term(tokens, position):
+    # A term is a single token plus an optional language tag or datatype,
+    # e.g. "Budapest" @en or "5" ^^ <http://www.w3.org/2001/XMLSchema#int>.
+    end = position + 1
+    while end < len(tokens):
+        if tokens[end].startswith("@") and end == position + 1:
+            end += 1
+        elif tokens[end].startswith("^^"):
+            end += 1 if len(tokens[end]) > 2 else 2
+        else:
+            break
+    return " ".join(tokens[position:end]), end
+
+
+def _sorted_values_block(tokens, position):
+    # VALUES ?var { term term ... }; the multi-variable form is left as is.
+    if (
+        position + 2 >= len(tokens)
+        or not tokens[position + 1].startswith(("?", "$"))
+        or tokens[position + 2] != "{"
+    ):
+        return None
+    terms = []
+    cursor = position + 3
+    while cursor < len(tokens) and tokens[cursor] != "}":
+        if tokens[cursor] in ("(", ")", "{"):
+            return None
+        term, cursor = _read_term(tokens, cursor)
+        terms.append(term)
+    if cursor >= len(tokens):
+        return None
+    block = [tokens[position], tokens[position + 1], "{", *sorted(terms), "}"]
+    return block, cursor + 1
+
+
+def _sorted_in_list(tokens, position):
+    # IN ( term , term , ... ) and NOT IN ( ... ) describe sets of terms.
+    if position + 1 >= len(tokens) or tokens[position + 1] != "(":
+        return None
+    terms = []
+    cursor = position + 2
+    while cursor < len(tokens) and tokens[cursor] != ")":
+        if tokens[cursor] in ("(", "{", "}"):
+            return None
+        term, cursor = _read_term(tokens, cursor)
+        terms.append(term)
+        if cursor < len(tokens) and tokens[cursor] == ",":
+            cursor += 1
+    if cursor >= len(tokens):
+        return None
+    block = [tokens[position], "(", " , ".join(sorted(set(terms))), ")"]
+    return block, cursor + 1
+
+
+def canonicalize_query(query):
+    tokens = tokenize_query(query)
+    canonical_tokens = []
+    position = 0
+    while position < len(tokens):
+        keyword = tokens[position].upper()
+        rewritten = None
+        if keyword == "VALUES":
+            rewritten = _sorted_values_block(tokens, position)
+        elif keyword == "IN":
+            rewritten = _sorted_in_list(tokens, position)
+        if rewritten is None:
+            canonical_tokens.append(tokens[position])
+            position += 1
+        else:
+            block, position = rewritten
+            canonical_tokens.extend(block)
+    return " ".join(canonical_tokens)
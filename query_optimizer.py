@@ -0,0 +1,225 @@
+import json
+import os
+import threading
+import time
+
+from prefixed_names import expand_prefixed_name
+from sparql_errors import SPARQLTimeoutError
+from sparql_results import iter_result_rows
+from config import (
+    DEFAULT_EXPLORER_RESULT_FORMAT,
+    DEFAULT_PREDICATE_STATISTICS_PATH,
+    DEFAULT_PREDICATE_STATISTICS_TTL_SECONDS,
+    DEFAULT_PREDICATE_STATISTICS_BATCH,
+)
+
+# Stand-in triple count for predicates whose statistics timed out.
+UNKNOWN_CARDINALITY = 10**9
+
+
+class PredicateStatistics:
+    # Triple, distinct subject and distinct object counts per predicate, kept
+    # on disk so each predicate is counted on the endpoint only once.
+    def __init__(
+        self,
+        sparql_wrapper,
+        path=DEFAULT_PREDICATE_STATISTICS_PATH,
+        ttl_seconds=DEFAULT_PREDICATE_STATISTICS_TTL_SECONDS,
+        result_format=DEFAULT_EXPLORER_RESULT_FORMAT,
+        batch_size=DEFAULT_PREDICATE_STATISTICS_BATCH,
+    ):
+        self.sparql = sparql_wrapper
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.result_format = result_format
+        self.batch_size = batch_size
+        self._statistics = None
+        self._lock = threading.Lock()
+
+    def _statistics_key(self):
+        return f"{self.sparql.endpoint} {self.sparql.default_graph or ''}"
+
+    def _read_statistics_file(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable predicate statistics {self.path}: {e}")
+            return {}
+
+    def _write_statistics_file(self):
+        statistics = self._read_statistics_file()
+        statistics[self._statistics_key()] = self._statistics
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(statistics, f)
+        os.replace(temporary_path, self.path)
+
+    def _count_query(self, predicates):
+        values = " ".join("<" + predicate + ">" for predicate in predicates)
+        return f"""SELECT ?edge (COUNT(*) AS ?triples) (COUNT(DISTINCT ?subject) AS ?subjects) (COUNT(DISTINCT ?object) AS ?objects)
+                WHERE {{
+                    VALUES ?edge {{ {values} }}
+                    ?subject ?edge ?object .
+                }}
+                GROUP BY ?edge"""
+
+    def _count(self, predicates):
+        try:
+            rows = list(
+                iter_result_rows(
+                    self.sparql,
+                    self._count_query(predicates),
+                    ("edge", "triples", "subjects", "objects"),
+                    self.result_format,
+                )
+            )
+        except SPARQLTimeoutError:
+            if len(predicates) > 1:
+                counts = {}
+                for predicate in predicates:
+                    counts.update(self._count([predicate]))
+                return counts
+            return {predicates[0]: None}
+        counts = {predicate: [0, 0, 0] for predicate in predicates}
+        for edge, triples, subjects, objects in rows:
+            counts[edge] = [int(triples), int(subjects), int(objects)]
+        return counts
+
+    def counts(self, predicates):
+        # Returns {predicate: [triples, subjects, objects]}, or None for the
+        # predicates that could not be counted within the endpoint timeout.
+        with self._lock:
+            if self._statistics is None:
+                self._statistics = self._read_statistics_file().get(
+                    self._statistics_key(), {}
+                )
+            now = time.time()
+            missing = [
+                predicate
+                for predicate in dict.fromkeys(predicates)
+                if predicate not in self._statistics
+                or now - self._statistics[predicate]["created"] >= self.ttl_seconds
+            ]
+            for start in range(0, len(missing), self.batch_size):
+                batch = missing[start : start + self.batch_size]
+                for predicate, counts in self._count(batch).items():
+                    self._statistics[predicate] = {"created": now, "counts": counts}
+            if missing and self.path:
+                self._write_statistics_file()
+            return {
+                predicate: self._statistics[predicate]["counts"]
+                for predicate in predicates
+            }
+
+
+class QueryOptimizer:
+    # Rewrites the triple patterns of a generated query: patterns implied by
+    # another pattern are dropped and the rest are ordered most selective
+    # first, following the joins, based on PredicateStatistics.
+    def __init__(self, statistics):
+        self.statistics = statistics
+
+    @staticmethod
+    def _predicate_iri(predicate, defined_prefixes):
+        return expand_prefixed_name(predicate, defined_prefixes).strip("<>")
+
+    @staticmethod
+    def remove_subsumed_patterns(patterns, values_clause_map):
+        # A pattern whose subject or object is a variable used nowhere else is
+        # implied by any other pattern with the same predicate and the same
+        # other end, so it never removes a binding of ?e.
+        restricted_variables = {"?e"}
+        restricted_variables.update(
+            variable for variable, _ in values_clause_map.values()
+        )
+        occurrences = {}
+        for subject, _, obj in patterns:
+            for term in (subject, obj):
+                occurrences[term] = occurrences.get(term, 0) + 1
+
+        def is_dangling(term):
+            return (
+                term.startswith("?")
+                and term not in restricted_variables
+                and occurrences[term] == 1
+            )
+
+        kept = list(dict.fromkeys(patterns))
+        for pattern in list(kept):
+            subject, predicate, obj = pattern
+            if not (is_dangling(subject) or is_dangling(obj)):
+                continue
+            for other_subject, other_predicate, other_obj in kept:
+                if (other_subject, other_predicate, other_obj) == pattern:
+                    continue
+                if (
+                    other_predicate == predicate
+                    and (is_dangling(subject) or other_subject == subject)
+                    and (is_dangling(obj) or other_obj == obj)
+                ):
+                    kept.remove(pattern)
+                    break
+        return kept
+
+    def _pattern_cost(self, pattern, counts, bound_variables, values_sizes):
+        subject, _, obj = pattern
+        triples, subjects, objects = counts or (UNKNOWN_CARDINALITY, 1, 1)
+        subject_bound = not subject.startswith("?") or subject in bound_variables
+        object_bound = not obj.startswith("?") or obj in bound_variables
+        # Every value of a VALUES variable is one more lookup.
+        multiplier = values_sizes.get(subject, 1) * values_sizes.get(obj, 1)
+        if subject_bound and object_bound:
+            return multiplier
+        if subject_bound:
+            return multiplier * triples / max(subjects, 1)
+        if object_bound:
+            return multiplier * triples / max(objects, 1)
+        return triples
+
+    def order_patterns(self, patterns, defined_prefixes, values_clause_map):
+        predicate_iris = {
+            predicate: self._predicate_iri(predicate, defined_prefixes)
+            for _, predicate, _ in patterns
+        }
+        counts = self.statistics.counts(list(dict.fromkeys(predicate_iris.values())))
+        values_sizes = {
+            variable: len(uris)
+            for variable, uris in values_clause_map.values()
+            if variable != "?e"  # The seed entities get no VALUES clause
+        }
+        bound_variables = set(values_sizes)
+        remaining = list(patterns)
+        ordered = []
+        while remaining:
+            # Patterns joined to what is already bound come first, so the
+            # endpoint never has to build a cross product.
+            rank = lambda pattern: (
+                bool(ordered)
+                and pattern[0] not in bound_variables
+                and pattern[2] not in bound_variables,
+                self._pattern_cost(
+                    pattern,
+                    counts[predicate_iris[pattern[1]]],
+                    bound_variables,
+                    values_sizes,
+                ),
+            )
+            pattern = min(remaining, key=rank)
+            remaining.remove(pattern)
+            ordered.append(pattern)
+            bound_variables.update(
+                term for term in (pattern[0], pattern[2]) if term.startswith("?")
+            )
+        return ordered
+
+    def optimize(self, query_triplets_map, defined_prefixes, values_clause_map):
+        patterns = [
+            (subject, predicate, obj)
+            for subject, po_pairs in query_triplets_map.items()
+            for predicate, obj in po_pairs
+        ]
+        patterns = self.remove_subsumed_patterns(patterns, values_clause_map)
+        return self.order_patterns(patterns, defined_prefixes, values_clause_map)
@@ -0,0 +1,121 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from config import DEFAULT_SPLIT_QUERY_MAX_WORKERS
+
+
+def _is_joined_variable(term):
+    # Variables other than ?e tie triple patterns together.
+    return term.startswith("?") and term != "?e"
+
+
+class QuerySplitter:
+    # Splits an expansion query that exceeds the endpoint's length limit into
+    # sub-queries. Triple patterns that share a variable other than ?e stay in
+    # the same sub-query, so the sub-queries only have ?e in common and the
+    # intersection of their ?e bindings equals the result of the full query.
+    def __init__(
+        self, generator, max_query_length, max_workers=DEFAULT_SPLIT_QUERY_MAX_WORKERS
+    ):
+        self.generator = generator
+        self.max_query_length = max_query_length
+        self.max_workers = max_workers
+
+    def connected_components(self, query_triplets_map):
+        parents = {}
+
+        def find(term):
+            parents.setdefault(term, term)
+            while parents[term] != term:
+                parents[term] = parents[parents[term]]
+                term = parents[term]
+            return term
+
+        patterns = [
+            (subject, predicate, obj)
+            for subject, po_pairs in query_triplets_map.items()
+            for predicate, obj in po_pairs
+        ]
+        for index, (subject, _, obj) in enumerate(patterns):
+            for term in (subject, obj):
+                if _is_joined_variable(term):
+                    parents[find(("pattern", index))] = find(term)
+            find(("pattern", index))
+
+        components = {}
+        for index, pattern in enumerate(patterns):
+            components.setdefault(find(("pattern", index)), []).append(pattern)
+        return list(components.values())
+
+    def render_patterns(self, patterns, defined_prefixes, values_clause_map):
+        query_triplets_map = {}
+        variables = set()
+        for subject, predicate, obj in patterns:
+            query_triplets_map.setdefault(subject, []).append((predicate, obj))
+            variables.update((subject, obj))
+        sub_values_clause_map = {
+            key: (variable, uris)
+            for key, (variable, uris) in values_clause_map.items()
+            if variable in variables
+        }
+        QUERY = self.generator.create_query_from_processed_paths(
+            query_triplets_map, {"": ""}, sub_values_clause_map
+        )
+        # Only declare the prefixes the sub-query can refer to.
+        used_prefixes = {
+            namespace: prefix
+            for namespace, prefix in defined_prefixes.items()
+            if prefix and prefix in QUERY
+        }
+        if not used_prefixes:
+            return QUERY
+        return self.generator.create_query_from_processed_paths(
+            query_triplets_map, used_prefixes, sub_values_clause_map
+        )
+
+    def split(self, query_triplets_map, defined_prefixes, values_clause_map):
+        # Packs the components into as few sub-queries within max_query_length
+        # as it can (first fit, largest first). Returns None when a component
+        # does not fit on its own.
+        components = sorted(
+            self.connected_components(query_triplets_map),
+            key=lambda patterns: (
+                not any("?e" in (subject, obj) for subject, _, obj in patterns),
+                -len(patterns),
+            ),
+        )
+        chunks = []
+        for patterns in components:
+            binds_e = any("?e" in (subject, obj) for subject, _, obj in patterns)
+            for chunk in chunks:
+                QUERY = self.render_patterns(
+                    chunk["patterns"] + patterns, defined_prefixes, values_clause_map
+                )
+                if len(QUERY) <= self.max_query_length:
+                    chunk["patterns"].extend(patterns)
+                    chunk["query"] = QUERY
+                    break
+            else:
+                # A component without ?e only restricts the results together
+                # with patterns that bind ?e.
+                QUERY = self.render_patterns(
+                    patterns, defined_prefixes, values_clause_map
+                )
+                if not binds_e or len(QUERY) > self.max_query_length:
+                    return None
+                chunks.append({"patterns": list(patterns), "query": QUERY})
+        return [chunk["query"] for chunk in chunks] or None
+
+    def run(self, execute_query, queries):
+        # execute_query returns the ?e bindings of one sub-query; the result
+        # keeps the order of the first sub-query.
+        if self.max_workers > 1 and len(queries) > 1:
+            with ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="query-splitter"
+            ) as executor:
+                results = list(executor.map(execute_query, queries))
+        else:
+            results = [execute_query(QUERY) for QUERY in queries]
+        common_entities = set(results[0])
+        for entities in results[1:]:
+            common_entities.intersection_update(entities)
+        return [entity for entity in results[0] if entity in common_entities]
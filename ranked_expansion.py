@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from config import (
+    DEFAULT_SPLIT_QUERY_MAX_WORKERS,
+    DEFAULT_RANKED_MAX_ROWS_PER_PATTERN,
+)
+
+
+class RankedExpansion:
+    # Ranks candidate entities by how many path patterns of a generated query
+    # they satisfy. A path pattern is one connected component of the query
+    # (see QuerySplitter); candidates satisfying all of them are exactly the
+    # result of the strict query. Patterns are evaluated a batch at a time and
+    # evaluation stops once no remaining pattern can change the top k.
+    def __init__(
+        self,
+        sparql_wrapper,
+        splitter,
+        max_rows_per_pattern=DEFAULT_RANKED_MAX_ROWS_PER_PATTERN,
+        max_workers=DEFAULT_SPLIT_QUERY_MAX_WORKERS,
+    ):
+        self.sparql = sparql_wrapper
+        self.splitter = splitter
+        self.max_rows_per_pattern = max_rows_per_pattern
+        self.max_workers = max_workers
+        self.patterns_evaluated = 0
+        self.pattern_count = 0
+        self.complete = False
+
+    def pattern_queries(self, query_triplets_map, defined_prefixes, values_clause_map):
+        # Larger components first: they tend to be the most selective. Queries
+        # over the length limit are kept as None and never evaluated.
+        components = sorted(
+            self.splitter.connected_components(query_triplets_map),
+            key=lambda patterns: -len(patterns),
+        )
+        pattern_queries = []
+        for patterns in components:
+            QUERY = self.splitter.render_patterns(
+                patterns, defined_prefixes, values_clause_map
+            )
+            if len(QUERY) > self.splitter.max_query_length:
+                QUERY = None
+            pattern_queries.append(QUERY)
+        return pattern_queries
+
+    def _pattern_entities(self, QUERY):
+        # Returns (entities, complete). Pages are fetched one at a time and
+        # reading stops at max_rows_per_pattern entities, before the next page
+        # is requested; a pattern that reaches the cap counts as incomplete.
+        if QUERY is None:
+            return [], False
+        rows = self.sparql.iter_query(QUERY, max_parallel_pages=1)
+        entities = []
+        for result in rows:
+            if "e" in result and result["e"]["type"] == "uri":
+                entities.append(result["e"]["value"])
+                if len(entities) >= self.max_rows_per_pattern:
+                    rows.close()
+                    return entities, False
+        return entities, True
+
+    @staticmethod
+    def _top_k_settled(ranked, support, pending, truncated, top_k):
+        # The top k is settled when no other candidate, seen or not, can reach
+        # the support of the k-th one with the patterns still unresolved.
+        if len(ranked) < top_k:
+            return False
+        kth_support = support[ranked[top_k - 1]]
+        best_other = pending + len(truncated)
+        for entity in ranked[top_k:]:
+            best_other = max(
+                best_other,
+                support[entity]
+                + pending
+                + sum(1 for entities in truncated if entity not in entities),
+            )
+        return kth_support >= best_other
+
+    def rank(self, pattern_queries, top_k):
+        # Returns [(entity, support)] for the best top_k candidates. Supports
+        # are exact when self.complete is set after the call, lower bounds
+        # otherwise.
+        self.pattern_count = len(pattern_queries)
+        self.patterns_evaluated = 0
+        self.complete = False
+        support = {}
+        truncated = []
+        batch_size = max(self.max_workers, 1)
+        with ThreadPoolExecutor(
+            max_workers=batch_size, thread_name_prefix="ranked-expansion"
+        ) as executor:
+            for start in range(0, len(pattern_queries), batch_size):
+                batch = pattern_queries[start : start + batch_size]
+                for entities, complete in executor.map(self._pattern_entities, batch):
+                    for entity in entities:
+                        support[entity] = support.get(entity, 0) + 1
+                    if not complete:
+                        truncated.append(set(entities))
+                self.patterns_evaluated += len(batch)
+                ranked = sorted(support, key=lambda entity: -support[entity])
+                pending = len(pattern_queries) - self.patterns_evaluated
+                if pending and self._top_k_settled(
+                    ranked, support, pending, truncated, top_k
+                ):
+                    break
+        self.complete = (
+            self.patterns_evaluated == len(pattern_queries) and not truncated
+        )
+        ranked = sorted(support, key=lambda entity: -support[entity])
+        return [(entity, support[entity]) for entity in ranked[:top_k]]
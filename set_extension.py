@@ -1,12 +1,22 @@
 from graph_explorer import GraphExplorer
 from path_processor import PathProcessor
 from query_generator import QueryGenerator
+from query_splitter import QuerySplitter
+from ranked_expansion import RankedExpansion
+from query_optimizer import PredicateStatistics, QueryOptimizer
+from query_fingerprint import canonical_query_key, structural_fingerprint
 from config import (
     DEFAULT_FILTER_PATTERN,
     DEFAULT_PATH_LENGTH,
     DEFAULT_RIGHT_EXTENSIONS,
     DEFAULT_MIN_OR_NUM,
     DEFAULT_MAX_OR_NUM,
+    DEFAULT_EXPLORATION_MODE,
+    DEFAULT_EDGE_FILTER_MODE,
+    DEFAULT_EXPLORATION_STRATEGY,
+    DEFAULT_OPTIMIZE_QUERIES,
+    DEFAULT_USE_PREFIXED_NAMES,
+    DEFAULT_RANKED_TOP_K,
 )
 
 
@@ -19,34 +29,178 @@ class CompositeGraphBasedSetExtension:
         filter_pattern=DEFAULT_FILTER_PATTERN,
         min_entities_for_values_clause=DEFAULT_MIN_OR_NUM,
         max_entities_in_path_node=DEFAULT_MAX_OR_NUM,
+        exploration_mode=DEFAULT_EXPLORATION_MODE,
+        adjacency_cache=None,
+        edge_filter_mode=DEFAULT_EDGE_FILTER_MODE,
+        predicate_index=None,
+        exploration_strategy=DEFAULT_EXPLORATION_STRATEGY,
+        exploration_budget=None,
+        artifact_store=None,
+        max_query_length=None,
+        optimize_queries=DEFAULT_OPTIMIZE_QUERIES,
+        query_optimizer=None,
+        use_prefixed_names=DEFAULT_USE_PREFIXED_NAMES,
+        query_result_cache=None,
     ):
 
         self.sparql = sparql_wrapper
+        self.artifact_store = artifact_store
+        # Optional CanonicalQueryCache; the fingerprint and cache outcome of
+        # the last generated query are kept for reporting.
+        self.query_result_cache = query_result_cache
+        self.last_query_fingerprint = None
+        self.last_query_cache_hit = False
         self.explorer = GraphExplorer(
             sparql_wrapper,
             filter_pattern,
             path_length,
             right_extensions,
             max_entities_in_path_node,
+            exploration_mode=exploration_mode,
+            adjacency_cache=adjacency_cache,
+            edge_filter_mode=edge_filter_mode,
+            predicate_index=predicate_index,
+            strategy=exploration_strategy,
+            budget=exploration_budget,
         )
         self.processor = PathProcessor(
-            min_entities_for_values_clause, max_entities_in_path_node
+            min_entities_for_values_clause,
+            max_entities_in_path_node,
+            use_prefixed_names=use_prefixed_names,
         )
+        # The optimizer, and the predicate statistics it caches, can be
+        # shared by models using the same endpoint.
+        if optimize_queries and query_optimizer is None:
+            query_optimizer = QueryOptimizer(PredicateStatistics(sparql_wrapper))
         self.generator = QueryGenerator(
-            min_entities_for_values_clause, max_entities_in_path_node
+            min_entities_for_values_clause,
+            max_entities_in_path_node,
+            optimizer=query_optimizer if optimize_queries else None,
+            use_prefixed_names=use_prefixed_names,
         )
+        # Longer generated queries are split; defaults to the endpoint's limit.
+        self.splitter = QuerySplitter(
+            self.generator, max_query_length or sparql_wrapper.policy.max_query_length
+        )
+        self.ranker = RankedExpansion(sparql_wrapper, self.splitter)
 
     def get_results(self, start_entities):
         if not start_entities or len(start_entities) < 1:
             print("Warning: At least one seed entity is required.")
             return [], "", []
 
-        all_paths = self.explorer.get_expansion_graph(start_entities)
+        all_paths = self.get_expansion_paths(start_entities)
+        return self.get_results_from_paths(start_entities, all_paths)
+
+    def get_ranked_results(self, start_entities, top_k=DEFAULT_RANKED_TOP_K):
+        # Relaxed counterpart of get_results: candidates are ranked by the
+        # number of path patterns they satisfy instead of having to satisfy
+        # all of them. Returns [(entity, support)], the query and the paths.
+        if not start_entities or len(start_entities) < 1:
+            print("Warning: At least one seed entity is required.")
+            return [], "", []
+
+        all_paths = self.get_expansion_paths(start_entities)
+        if not all_paths:
+            print("No expansion paths found.")
+            return [], "", []
+
+        QUERY, query_triplets_map, defined_prefixes, values_clause_map = (
+            self.build_query(start_entities, all_paths)
+        )
+        pattern_queries = self.ranker.pattern_queries(
+            query_triplets_map, defined_prefixes, values_clause_map
+        )
+        ranked_entities = []
+        try:
+            ranked_entities = self.ranker.rank(pattern_queries, top_k)
+        except Exception as e:
+            print(f"Error executing ranked expansion sub-queries: {e}")
+            print(f"Query: {QUERY}")
+            return [], QUERY, all_paths
+        if self.ranker.patterns_evaluated < self.ranker.pattern_count:
+            print(
+                f"Top {top_k} settled after {self.ranker.patterns_evaluated} of {self.ranker.pattern_count} path patterns."
+            )
+        return ranked_entities, QUERY, all_paths
+
+    def get_expansion_paths(self, start_entities):
+        if self.artifact_store is None:
+            return self.explorer.get_expansion_graph(start_entities)
+        exploration_config = self.explorer.exploration_config()
+        all_paths = self.artifact_store.load(start_entities, exploration_config)
+        if all_paths is None:
+            all_paths = self.explorer.get_expansion_graph(start_entities)
+            self.artifact_store.save(
+                start_entities,
+                exploration_config,
+                all_paths,
+                self.explorer.stop_reason,
+            )
+        return all_paths
 
+    def get_results_from_paths(self, start_entities, all_paths):
+        # Runs only path processing, query generation and execution, e.g. on
+        # paths loaded from an ExplorationArtifactStore.
         if not all_paths:
             print("No expansion paths found.")
             return [], "", []
 
+        QUERY, query_triplets_map, defined_prefixes, values_clause_map = (
+            self.build_query(start_entities, all_paths)
+        )
+        self.last_query_fingerprint = structural_fingerprint(
+            query_triplets_map, defined_prefixes, values_clause_map
+        )
+        self.last_query_cache_hit = False
+        query_key = None
+        if self.query_result_cache is not None:
+            query_key = canonical_query_key(
+                query_triplets_map, defined_prefixes, values_clause_map
+            )
+            cached_entities = self.query_result_cache.get(query_key)
+            if cached_entities is not None:
+                self.last_query_cache_hit = True
+                return cached_entities, QUERY, all_paths
+
+        sub_queries = [QUERY]
+        if len(QUERY) > self.splitter.max_query_length:
+            sub_queries = self.splitter.split(
+                query_triplets_map, defined_prefixes, values_clause_map
+            )
+            if sub_queries is None:
+                print(
+                    f"Warning: Generated query is too long ({len(QUERY)} chars) and cannot be split. Skipping execution."
+                )
+                print(f"Query: {QUERY}")
+                return [], QUERY, all_paths
+            print(
+                f"Generated query is too long ({len(QUERY)} chars), running it as {len(sub_queries)} sub-queries."
+            )
+
+        expanded_entities = []
+        try:
+            expanded_entities = self.splitter.run(
+                self._run_expansion_query, sub_queries
+            )
+            if query_key is not None:
+                self.query_result_cache.set(query_key, expanded_entities)
+        except Exception as e:
+            print(f"Error executing generated SPARQL query: {e}")
+            print(f"Query: {QUERY}")
+
+        return expanded_entities, QUERY, all_paths
+
+    def _run_expansion_query(self, QUERY):
+        return [
+            result["e"]["value"]
+            for result in self.sparql.run_query(QUERY)
+            if "e" in result and result["e"]["type"] == "uri"
+        ]
+
+    def build_query(self, start_entities, all_paths):
+        # Returns the generated query together with the pattern, prefix and
+        # VALUES tables it was rendered from.
         all_variable_paths, entity_to_variable_map = (
             self.processor.get_all_variable_paths(all_paths, start_entities)
         )
@@ -66,24 +220,4 @@ class CompositeGraphBasedSetExtension:
         QUERY = self.generator.create_query_from_processed_paths(
             query_triplets_map, defined_prefixes, values_clause_map
         )
-
-        if len(QUERY) > 7800:
-            print(
-                f"Warning: Generated query is too long ({len(QUERY)} chars). Skipping execution."
-            )
-            print(f"Query: {QUERY}")
-            return [], QUERY, all_paths
-
-        expanded_entities = []
-        try:
-            query_execution_results = self.sparql.run_query(QUERY)
-            expanded_entities = [
-                result["e"]["value"]
-                for result in query_execution_results
-                if "e" in result and result["e"]["type"] == "uri"
-            ]
-        except Exception as e:
-            print(f"Error executing generated SPARQL query: {e}")
-            print(f"Query: {QUERY}")
-
-        return expanded_entities, QUERY, all_paths
+        return QUERY, query_triplets_map, defined_prefixes, values_clause_map
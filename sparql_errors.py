@@ -0,0 +1,31 @@
+class SPARQLEndpointError(Exception):
+    def __init__(self, message, status=None, body=None):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+class SPARQLConnectionError(SPARQLEndpointError):
+    pass
+
+
+class SPARQLTimeoutError(SPARQLEndpointError):
+    pass
+
+
+class SPARQLRateLimitError(SPARQLEndpointError):
+    def __init__(self, message, status=None, body=None, retry_after=None):
+        super().__init__(message, status=status, body=body)
+        self.retry_after = retry_after
+
+
+class SPARQLCircuitOpenError(SPARQLEndpointError):
+    pass
+
+
+class SPARQLPartialResultError(SPARQLEndpointError):
+    # Raised when a later page of a paginated query fails; `partial_results`
+    # holds the rows fetched before the failure and `__cause__` the failure.
+    def __init__(self, message, partial_results):
+        super().__init__(message)
+        self.partial_results = partial_results
@@ -0,0 +1,80 @@
+import csv
+
+_TSV_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", '"': '"', "'": "'", "\\": "\\"}
+
+
+def _unescape_tsv_string(lexical_form):
+    if "\\" not in lexical_form:
+        return lexical_form
+    characters = []
+    position = 0
+    while position < len(lexical_form):
+        character = lexical_form[position]
+        if character == "\\" and position + 1 < len(lexical_form):
+            escaped = lexical_form[position + 1]
+            if escaped == "u":
+                characters.append(
+                    chr(int(lexical_form[position + 2 : position + 6], 16))
+                )
+                position += 6
+                continue
+            if escaped == "U":
+                characters.append(
+                    chr(int(lexical_form[position + 2 : position + 10], 16))
+                )
+                position += 10
+                continue
+            characters.append(_TSV_ESCAPES.get(escaped, escaped))
+            position += 2
+            continue
+        characters.append(character)
+        position += 1
+    return "".join(characters)
+
+
+def parse_tsv_term(term):
+    if not term:
+        return None
+    if term[0] == "<" and term[-1] == ">":
+        return term[1:-1]
+    if term[0] == '"':
+        # "lexical form" optionally followed by @lang or ^^<datatype>
+        closing_quote = term.rfind('"')
+        return _unescape_tsv_string(term[1:closing_quote])
+    return term
+
+
+def iter_tsv_rows(lines):
+    lines = iter(lines)
+    for header in lines:
+        if header.strip():
+            break
+    for line in lines:
+        line = line.rstrip("\r")
+        if not line:
+            continue
+        yield tuple(parse_tsv_term(term) for term in line.split("\t"))
+
+
+def iter_csv_rows(lines):
+    # Line endings are restored so that quoted values spanning lines parse.
+    rows = (row for row in csv.reader(line + "\n" for line in lines) if row)
+    next(rows, None)
+    for row in rows:
+        yield tuple(value if value != "" else None for value in row)
+
+
+TUPLE_ROW_PARSERS = {"tsv": iter_tsv_rows, "csv": iter_csv_rows}
+
+
+def iter_result_rows(sparql_wrapper, QUERY, variables, result_format="json"):
+    # Rows come back as tuples of plain values in the order of `variables`,
+    # which must match the SELECT clause for the tsv/csv formats.
+    if result_format == "json":
+        for result in sparql_wrapper.run_query(QUERY):
+            yield tuple(
+                result[variable]["value"] if variable in result else None
+                for variable in variables
+            )
+    else:
+        yield from sparql_wrapper.iter_query(QUERY, result_format=result_format)
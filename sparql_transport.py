@@ -0,0 +1,296 @@
+import http.client
+import json
+import threading
+import zlib
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urlsplit
+
+from SPARQLWrapper import SPARQLWrapper, JSON, CSV, TSV
+from SPARQLWrapper.SPARQLExceptions import SPARQLWrapperException
+from sparql_errors import (
+    SPARQLEndpointError,
+    SPARQLConnectionError,
+    SPARQLTimeoutError,
+    SPARQLRateLimitError,
+)
+from config import DEFAULT_MAX_GET_URL_LENGTH
+
+SPARQL_JSON_MEDIA_TYPE = "application/sparql-results+json"
+# Markers Virtuoso puts in the error body when a query hits its time limit.
+ENDPOINT_TIMEOUT_MARKERS = ("S1T00", "SR171", "timed out", "Estimated execution time")
+RATE_LIMIT_STATUSES = (429, 503)
+
+RESULT_MEDIA_TYPES = {
+    "json": SPARQL_JSON_MEDIA_TYPE,
+    "tsv": "text/tab-separated-values",
+    "csv": "text/csv",
+}
+
+
+class PooledHTTPTransport:
+    # Exceptions raised when a keep-alive connection was closed by the server
+    # between two requests; the request is retried once on a fresh connection.
+    STALE_CONNECTION_ERRORS = (
+        http.client.RemoteDisconnected,
+        http.client.CannotSendRequest,
+        http.client.BadStatusLine,
+        BrokenPipeError,
+        ConnectionResetError,
+    )
+    STREAM_CHUNK_SIZE = 64 * 1024
+
+    def __init__(
+        self,
+        timeout=30,
+        max_get_url_length=DEFAULT_MAX_GET_URL_LENGTH,
+        accept_gzip=True,
+        user_agent="ESE-with-KG-Patterns",
+    ):
+        self.timeout = timeout
+        self.max_get_url_length = max_get_url_length
+        self.accept_gzip = accept_gzip
+        self.user_agent = user_agent
+        self.connections_opened = 0
+        self.requests_sent = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+    def _connection_pool(self):
+        pool = getattr(self._local, "pool", None)
+        if pool is None:
+            pool = self._local.pool = {}
+        return pool
+
+    def _get_connection(self, scheme, netloc):
+        pool = self._connection_pool()
+        conn = pool.get((scheme, netloc))
+        if conn is not None:
+            return conn, True
+        connection_class = (
+            http.client.HTTPSConnection
+            if scheme == "https"
+            else http.client.HTTPConnection
+        )
+        conn = connection_class(netloc, timeout=self.timeout)
+        pool[(scheme, netloc)] = conn
+        with self._stats_lock:
+            self.connections_opened += 1
+        return conn, False
+
+    def _discard_connection(self, scheme, netloc):
+        conn = self._connection_pool().pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+
+    def _build_request(self, url_parts, query, default_graph, accept):
+        params = [("query", query)]
+        if default_graph:
+            params.append(("default-graph-uri", default_graph))
+        encoded_params = urlencode(params)
+        path = url_parts.path or "/"
+        get_path = (
+            f"{path}?{url_parts.query + '&' if url_parts.query else ''}{encoded_params}"
+        )
+
+        headers = {
+            "Accept": accept,
+            "User-Agent": self.user_agent,
+            "Connection": "keep-alive",
+        }
+        if self.accept_gzip:
+            headers["Accept-Encoding"] = "gzip, deflate"
+
+        # Long queries do not fit into a GET request line, so they are sent as
+        # a form-encoded POST as allowed by the SPARQL 1.1 protocol.
+        if len(url_parts.netloc) + len(get_path) <= self.max_get_url_length:
+            return "GET", get_path, None, headers
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+        post_path = path + (f"?{url_parts.query}" if url_parts.query else "")
+        return "POST", post_path, encoded_params.encode("utf-8"), headers
+
+    @staticmethod
+    def _body_decoder(response):
+        encoding = (response.getheader("Content-Encoding") or "").lower()
+        if encoding == "gzip":
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if encoding == "deflate":
+            return zlib.decompressobj()
+        return None
+
+    def _decode_payload(self, response, raw_body):
+        decoder = self._body_decoder(response)
+        if decoder is None:
+            return raw_body
+        return decoder.decompress(raw_body) + decoder.flush()
+
+    def _send(self, endpoint, query, default_graph, accept):
+        url_parts = urlsplit(endpoint)
+        pool_key = (url_parts.scheme, url_parts.netloc)
+        method, path, body, headers = self._build_request(
+            url_parts, query, default_graph, accept
+        )
+        while True:
+            conn, reused = self._get_connection(*pool_key)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+            except self.STALE_CONNECTION_ERRORS as e:
+                self._discard_connection(*pool_key)
+                if reused:
+                    continue
+                raise self._as_endpoint_error(e) from e
+            except Exception as e:
+                self._discard_connection(*pool_key)
+                raise self._as_endpoint_error(e) from e
+            with self._stats_lock:
+                self.requests_sent += 1
+            return pool_key, response
+
+    @staticmethod
+    def _as_endpoint_error(error):
+        if isinstance(error, SPARQLEndpointError):
+            return error
+        if isinstance(error, TimeoutError):
+            return SPARQLTimeoutError(f"Request timed out: {error}")
+        return SPARQLConnectionError(f"Connection to endpoint failed: {error}")
+
+    def _raise_for_status(self, response, payload):
+        if response.status == 200:
+            return
+        message = payload.decode("utf-8", errors="replace")
+        description = f"HTTP {response.status} {response.reason}: {message[:500]}"
+        if response.status in RATE_LIMIT_STATUSES:
+            retry_after = response.getheader("Retry-After")
+            raise SPARQLRateLimitError(
+                description,
+                status=response.status,
+                body=message,
+                retry_after=(
+                    float(retry_after)
+                    if retry_after and retry_after.isdigit()
+                    else None
+                ),
+            )
+        if any(marker in message for marker in ENDPOINT_TIMEOUT_MARKERS):
+            raise SPARQLTimeoutError(description, status=response.status, body=message)
+        raise SPARQLEndpointError(description, status=response.status, body=message)
+
+    def request(
+        self, endpoint, query, default_graph=None, accept=SPARQL_JSON_MEDIA_TYPE
+    ):
+        pool_key, response = self._send(endpoint, query, default_graph, accept)
+        try:
+            raw_body = response.read()
+        except Exception as e:
+            self._discard_connection(*pool_key)
+            raise self._as_endpoint_error(e) from e
+        if response.will_close:
+            self._discard_connection(*pool_key)
+
+        payload = self._decode_payload(response, raw_body)
+        self._local.last_response_size = len(payload)
+        self._raise_for_status(response, payload)
+        return payload
+
+    def iter_lines(
+        self, endpoint, query, default_graph=None, accept=SPARQL_JSON_MEDIA_TYPE
+    ):
+        pool_key, response = self._send(endpoint, query, default_graph, accept)
+        fully_read = False
+        try:
+            if response.status != 200:
+                raw_body = response.read()
+                fully_read = True
+                self._raise_for_status(
+                    response, self._decode_payload(response, raw_body)
+                )
+
+            decoder = self._body_decoder(response)
+            payload_size = 0
+            pending = b""
+            while True:
+                try:
+                    chunk = response.read1(self.STREAM_CHUNK_SIZE)
+                except Exception as e:
+                    raise self._as_endpoint_error(e) from e
+                if not chunk:
+                    break
+                if decoder:
+                    chunk = decoder.decompress(chunk)
+                payload_size += len(chunk)
+                *lines, pending = (pending + chunk).split(b"\n")
+                for line in lines:
+                    yield line.decode("utf-8")
+            fully_read = True
+            response.close()
+            if decoder:
+                pending += decoder.flush()
+            self._local.last_response_size = payload_size + len(pending)
+            if pending:
+                yield pending.decode("utf-8")
+        finally:
+            # A partially consumed response leaves unread bytes on the socket,
+            # so that connection cannot be reused for the next request.
+            if not fully_read or response.will_close:
+                self._discard_connection(*pool_key)
+
+    def query(self, endpoint, query, default_graph=None):
+        return json.loads(self.request(endpoint, query, default_graph))
+
+    def last_response_size(self):
+        return getattr(self._local, "last_response_size", 0)
+
+    def close(self):
+        pool = self._connection_pool()
+        for conn in pool.values():
+            conn.close()
+        pool.clear()
+
+
+class SPARQLWrapperTransport:
+    # Opens a new connection per request through the SPARQLWrapper library.
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+
+    def _execute(self, sparql):
+        try:
+            return sparql.query()
+        except HTTPError as e:
+            message = e.read().decode("utf-8", errors="replace")
+            if e.code in RATE_LIMIT_STATUSES:
+                raise SPARQLRateLimitError(str(e), status=e.code, body=message) from e
+            raise SPARQLEndpointError(str(e), status=e.code, body=message) from e
+        except TimeoutError as e:
+            raise SPARQLTimeoutError(f"Request timed out: {e}") from e
+        except SPARQLWrapperException as e:
+            message = str(e)
+            if any(marker in message for marker in ENDPOINT_TIMEOUT_MARKERS):
+                raise SPARQLTimeoutError(message) from e
+            raise SPARQLEndpointError(message) from e
+        except (URLError, OSError) as e:
+            raise SPARQLConnectionError(f"Connection to endpoint failed: {e}") from e
+
+    def query(self, endpoint, query, default_graph=None):
+        sparql = SPARQLWrapper(endpoint)
+        if default_graph:
+            sparql.addDefaultGraph(default_graph)
+        sparql.setTimeout(self.timeout)
+        sparql.setQuery(query)
+        sparql.setReturnFormat(JSON)
+        return self._execute(sparql).convert()
+
+    def iter_lines(
+        self, endpoint, query, default_graph=None, accept=SPARQL_JSON_MEDIA_TYPE
+    ):
+        sparql = SPARQLWrapper(endpoint)
+        if default_graph:
+            sparql.addDefaultGraph(default_graph)
+        sparql.setTimeout(self.timeout)
+        sparql.setQuery(query)
+        return_format = {RESULT_MEDIA_TYPES["tsv"]: TSV, RESULT_MEDIA_TYPES["csv"]: CSV}
+        sparql.setReturnFormat(return_format.get(accept, JSON))
+        payload = self._execute(sparql).response.read().decode("utf-8")
+        return iter(payload.split("\n"))
+
+    def close(self):
+        pass
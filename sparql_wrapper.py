@@ -1,42 +1,401 @@
-from SPARQLWrapper import SPARQLWrapper, JSON
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from query_cache import MemoryQueryCache
+from query_normalizer import canonicalize_query
+from sparql_transport import PooledHTTPTransport, RESULT_MEDIA_TYPES
+from sparql_results import TUPLE_ROW_PARSERS
+from sparql_errors import SPARQLEndpointError, SPARQLPartialResultError
+from endpoint_policy import EndpointPolicy
+from config import (
+    DEFAULT_MEMORY_CACHE_MAX_BYTES,
+    DEFAULT_MEMORY_CACHE_POLICY,
+    DEFAULT_PAGE_SIZE,
+    DEFAULT_MIN_PAGE_SIZE,
+    DEFAULT_MAX_PAGE_SIZE,
+    DEFAULT_TARGET_PAGE_SECONDS,
+    DEFAULT_MAX_PAGE_BYTES,
+    DEFAULT_MAX_PARALLEL_PAGES,
+)
+
+# PREFIX and BASE declarations (and comments) at the start of a query, which
+# must stay in front of a query that wraps it.
+_PROLOGUE_PATTERN = re.compile(
+    r"\A(?:\s+|\#[^\n]*|PREFIX\s+[^\s:]*:\s*<[^<>]*>|BASE\s*<[^<>]*>)*",
+    re.IGNORECASE,
+)
+
+
+class AdaptivePageSizer:
+    def __init__(
+        self,
+        page_size=DEFAULT_PAGE_SIZE,
+        min_page_size=DEFAULT_MIN_PAGE_SIZE,
+        max_page_size=DEFAULT_MAX_PAGE_SIZE,
+        target_page_seconds=DEFAULT_TARGET_PAGE_SECONDS,
+        max_page_bytes=DEFAULT_MAX_PAGE_BYTES,
+    ):
+        self.min_page_size = min_page_size
+        self.max_page_size = max_page_size
+        self.target_page_seconds = target_page_seconds
+        self.max_page_bytes = max_page_bytes
+        self.page_size = max(min_page_size, min(page_size, max_page_size))
+
+    def observe(self, rows, limit, seconds, payload_bytes):
+        # Only full pages tell how the endpoint copes with the current size.
+        if rows < limit or limit != self.page_size:
+            return
+        scale = 2.0
+        if seconds > 0:
+            scale = min(scale, self.target_page_seconds / seconds)
+        if payload_bytes > 0:
+            scale = min(scale, self.max_page_bytes / payload_bytes)
+        scale = max(scale, 0.5)
+        self.page_size = max(
+            self.min_page_size, min(int(self.page_size * scale), self.max_page_size)
+        )
 
 
 class SPARQLWrapperCache:
-    def __init__(self, endpoint, default_graph, timeout=30):
+    def __init__(
+        self,
+        endpoint,
+        default_graph,
+        timeout=30,
+        persistent_cache=None,
+        memory_cache_max_bytes=DEFAULT_MEMORY_CACHE_MAX_BYTES,
+        memory_cache_policy=DEFAULT_MEMORY_CACHE_POLICY,
+        transport=None,
+        max_parallel_pages=DEFAULT_MAX_PARALLEL_PAGES,
+        page_sizer=None,
+        policy=None,
+    ):
         self.endpoint = endpoint
         self.default_graph = default_graph
         self.timeout = timeout
-        self.QUERY_RESULTS = {}
+        self.QUERY_RESULTS = MemoryQueryCache(
+            max_bytes=memory_cache_max_bytes, policy=memory_cache_policy
+        )
+        self.persistent_cache = persistent_cache
+        self.transport = transport or PooledHTTPTransport(timeout=timeout)
+        self.policy = policy or EndpointPolicy.for_endpoint(endpoint)
+        self.max_parallel_pages = max_parallel_pages
+        self.page_sizer = page_sizer or AdaptivePageSizer()
+        self._page_executor = None
+        self._inflight_queries = {}
+        self._inflight_lock = threading.Lock()
+        self.coalesced_requests = 0
+        # Requests deduplicated by AsyncSPARQLClients built on this wrapper.
+        self.async_coalesced_requests = 0
+        self.memory_hits = 0
+        self.memory_misses = 0
 
     def run_query_with_limits(self, QUERY, limit, offset):
-        sparql = SPARQLWrapper(self.endpoint)
-        sparql.addDefaultGraph(self.default_graph)
-        sparql.setTimeout(self.timeout)
-        sparql.setQuery(f"{QUERY}\nLIMIT {limit}\nOFFSET {offset}")
-        sparql.setReturnFormat(JSON)
-        return sparql.query().convert()
-
-    def run_query(self, QUERY):
-        if QUERY in self.QUERY_RESULTS:
-            return self.QUERY_RESULTS[QUERY]
-        results = []
-        limit = 10000
-        offset = 0
-        while True:
-            try:
-                result_page = self.run_query_with_limits(QUERY, limit, offset)
-            except Exception as e:
-                print(f"SPARQL query failed: {e}")
-                print(f"Query: {QUERY}")
-                return []
+        return self.policy.execute(
+            lambda: self.transport.query(
+                self.endpoint,
+                f"{QUERY}\nLIMIT {limit}\nOFFSET {offset}",
+                self.default_graph,
+            )
+        )
+
+    def cache_key(self, QUERY, result_format="json"):
+        if result_format == "json":
+            return canonicalize_query(QUERY)
+        return f"{result_format}:{canonicalize_query(QUERY)}"
 
-            current_bindings = result_page["results"]["bindings"]
-            results.extend(current_bindings)
+    def _persistent_key(self, cache_key):
+        return self.persistent_cache.make_key(
+            self.endpoint, self.default_graph, cache_key
+        )
 
+    def get_cached_results(self, QUERY, cache_key=None):
+        if cache_key is None:
+            cache_key = self.cache_key(QUERY)
+        cached_results = self.QUERY_RESULTS.get(cache_key)
+        if cached_results is not None:
+            self.memory_hits += 1
+        return cached_results
+
+    def _observe_page(self, rows, limit, start_time):
+        response_size = getattr(self.transport, "last_response_size", None)
+        self.page_sizer.observe(
+            rows,
+            limit,
+            time.monotonic() - start_time,
+            response_size() if response_size else 0,
+        )
+
+    def _fetch_page(self, QUERY, limit, offset):
+        start_time = time.monotonic()
+        result_page = self.run_query_with_limits(QUERY, limit, offset)
+        bindings = result_page["results"]["bindings"]
+        self._observe_page(len(bindings), limit, start_time)
+        return bindings
+
+    def _iter_pages_sequentially(self, QUERY, offset):
+        while True:
+            limit = self.page_sizer.page_size
+            current_bindings = self._fetch_page(QUERY, limit, offset)
+            yield current_bindings
             if len(current_bindings) < limit:
-                break
+                return
+            offset += limit
+
+    def count_query_results(self, QUERY):
+        # The query becomes a sub-select, which keeps its own ORDER BY, LIMIT,
+        # OFFSET and trailing VALUES; only the prologue is moved outside.
+        prologue = _PROLOGUE_PATTERN.match(QUERY).group()
+        count_query = (
+            f"{prologue}\nSELECT (COUNT(*) AS ?count) WHERE {{\n"
+            f"{QUERY[len(prologue):]}\n}}"
+        )
+        bindings = self.policy.execute(
+            lambda: self.transport.query(self.endpoint, count_query, self.default_graph)
+        )["results"]["bindings"]
+        return int(bindings[0]["count"]["value"]) if bindings else 0
+
+    def _iter_json_pages(self, QUERY, max_parallel_pages):
+        limit = self.page_sizer.page_size
+        first_page = self._fetch_page(QUERY, limit, 0)
+        yield first_page
+        if len(first_page) < limit:
+            return
+        if max_parallel_pages <= 1:
+            yield from self._iter_pages_sequentially(QUERY, limit)
+            return
+
+        try:
+            expected_count = self.count_query_results(QUERY)
+        except Exception as e:
+            print(f"Result count query failed, paging sequentially: {e}")
+            yield from self._iter_pages_sequentially(QUERY, limit)
+            return
+
+        page_size = self.page_sizer.page_size
+        planned_pages = [
+            (offset, page_size) for offset in range(limit, expected_count, page_size)
+        ]
+        if self._page_executor is None:
+            self._page_executor = ThreadPoolExecutor(
+                max_workers=max_parallel_pages, thread_name_prefix="sparql-page"
+            )
+        # Pages are fetched concurrently but yielded in offset order.
+        page_futures = [
+            self._page_executor.submit(self._fetch_page, QUERY, page_limit, offset)
+            for offset, page_limit in planned_pages
+        ]
+        offset = limit
+        last_page_full = True
+        for (planned_offset, page_limit), future in zip(planned_pages, page_futures):
+            current_bindings = future.result()
+            yield current_bindings
+            offset = planned_offset + page_limit
+            last_page_full = len(current_bindings) == page_limit
+
+        # The count is only an estimate if the data changed in between.
+        if last_page_full:
+            yield from self._iter_pages_sequentially(QUERY, offset)
+
+    def _open_tuple_page(self, QUERY, result_format, limit, offset):
+        def open_page():
+            rows = TUPLE_ROW_PARSERS[result_format](
+                self.transport.iter_lines(
+                    self.endpoint,
+                    f"{QUERY}\nLIMIT {limit}\nOFFSET {offset}",
+                    self.default_graph,
+                    accept=RESULT_MEDIA_TYPES[result_format],
+                )
+            )
+            # Reading the first row surfaces HTTP errors inside the policy so
+            # that they can still be retried.
+            return next(rows, None), rows
+
+        return self.policy.execute(open_page)
+
+    def _iter_tuple_rows(self, QUERY, result_format):
+        offset = 0
+        while True:
+            limit = self.page_sizer.page_size
+            start_time = time.monotonic()
+            first_row, rows = self._open_tuple_page(QUERY, result_format, limit, offset)
+            if first_row is None:
+                return
+            yield first_row
+            row_count = 1
+            for row in rows:
+                row_count += 1
+                yield row
+            self._observe_page(row_count, limit, start_time)
+            if row_count < limit:
+                return
             offset += limit
-            if not current_bindings and offset > 0:
-                break
-        self.QUERY_RESULTS[QUERY] = results
+
+    def _get_persistent_results(self, cache_key, result_format):
+        if self.persistent_cache is None:
+            return None
+        cached_results = self.persistent_cache.get(self._persistent_key(cache_key))
+        if cached_results is None:
+            return None
+        if result_format != "json":
+            cached_results = [tuple(row) for row in cached_results]
+        self.QUERY_RESULTS[cache_key] = cached_results
+        return cached_results
+
+    def _iter_fetched_rows(self, QUERY, result_format, max_parallel_pages):
+        if result_format != "json":
+            yield from self._iter_tuple_rows(QUERY, result_format)
+            return
+        if max_parallel_pages is None:
+            max_parallel_pages = self.max_parallel_pages
+        for page in self._iter_json_pages(QUERY, max_parallel_pages):
+            yield from page
+
+    def _store_results(self, cache_key, results):
+        self.QUERY_RESULTS[cache_key] = results
+        if self.persistent_cache is not None:
+            self.persistent_cache.set(
+                self._persistent_key(cache_key), results, endpoint=self.endpoint
+            )
+
+    def iter_query(
+        self, QUERY, result_format="json", max_parallel_pages=None, cache=True
+    ):
+        # json yields SPARQL JSON bindings; tsv and csv yield plain tuples of
+        # values in SELECT order, parsed line by line as the response streams.
+        if result_format != "json" and result_format not in TUPLE_ROW_PARSERS:
+            raise ValueError(f"Unsupported result format '{result_format}'")
+        cache_key = self.cache_key(QUERY, result_format)
+        cached_results = self.get_cached_results(QUERY, cache_key)
+        if cached_results is not None:
+            yield from cached_results
+            return
+        self.memory_misses += 1
+        cached_results = self._get_persistent_results(cache_key, result_format)
+        if cached_results is not None:
+            yield from cached_results
+            return
+
+        results = [] if cache else None
+        rows_yielded = 0
+        try:
+            for row in self._iter_fetched_rows(
+                QUERY, result_format, max_parallel_pages
+            ):
+                if results is not None:
+                    results.append(row)
+                rows_yielded += 1
+                yield row
+        except SPARQLEndpointError as e:
+            if not rows_yielded:
+                raise
+            raise SPARQLPartialResultError(
+                f"Query failed after {rows_yielded} rows: {e}", results
+            ) from e
+        if results is not None:
+            self._store_results(cache_key, results)
+
+    def run_query(self, QUERY, max_parallel_pages=None):
+        # Logically identical queries (whitespace, VALUES/IN ordering) share
+        # one cache entry and one in-flight request.
+        cache_key = self.cache_key(QUERY)
+        cached_results = self.get_cached_results(QUERY, cache_key)
+        if cached_results is not None:
+            return cached_results
+
+        # Single-flight: identical queries issued while one is already being
+        # fetched wait for that request instead of hitting the endpoint again.
+        with self._inflight_lock:
+            cached_results = self.QUERY_RESULTS.get(cache_key)
+            if cached_results is not None:
+                return cached_results
+            inflight_query = self._inflight_queries.get(cache_key)
+            is_leader = inflight_query is None
+            if is_leader:
+                inflight_query = Future()
+                self._inflight_queries[cache_key] = inflight_query
+            else:
+                self.coalesced_requests += 1
+        if not is_leader:
+            return inflight_query.result()
+
+        try:
+            results = self._load_query_results(QUERY, cache_key, max_parallel_pages)
+            inflight_query.set_result(results)
+            return results
+        except BaseException as e:
+            inflight_query.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight_queries[cache_key]
+
+    def _load_query_results(self, QUERY, cache_key, max_parallel_pages):
+        self.memory_misses += 1
+        cached_results = self._get_persistent_results(cache_key, "json")
+        if cached_results is not None:
+            return cached_results
+        results = []
+        try:
+            for row in self._iter_fetched_rows(QUERY, "json", max_parallel_pages):
+                results.append(row)
+        except SPARQLEndpointError as e:
+            if not results:
+                raise
+            raise SPARQLPartialResultError(
+                f"Query failed after {len(results)} rows: {e}", results
+            ) from e
+        self._store_results(cache_key, results)
         return results
+
+    def get_cache_stats(self):
+        memory_lookups = self.memory_hits + self.memory_misses
+        stats = {
+            "memory": {
+                "hits": self.memory_hits,
+                "misses": self.memory_misses,
+                "hit_rate": (
+                    self.memory_hits / memory_lookups if memory_lookups else 0.0
+                ),
+                **self.QUERY_RESULTS.stats(),
+            }
+        }
+        if self.persistent_cache is not None:
+            stats["persistent"] = self.persistent_cache.stats()
+        stats["coalesced_requests"] = self.coalesced_requests
+        stats["async_coalesced_requests"] = self.async_coalesced_requests
+        stats["endpoint_policy"] = self.policy.stats()
+        return stats
+
+    def report_cache_stats(self):
+        stats = self.get_cache_stats()
+        print("\n===== SPARQL Cache Statistics =====")
+        for tier in ("memory", "persistent"):
+            if tier not in stats:
+                continue
+            tier_stats = stats[tier]
+            print(
+                f"  {tier.capitalize()}: {tier_stats['hits']} hits, "
+                f"{tier_stats['misses']} misses "
+                f"(hit rate {tier_stats['hit_rate']:.1%}), "
+                f"{tier_stats['entries']} entries"
+            )
+        memory_stats = stats["memory"]
+        print(
+            f"  Memory resident: {memory_stats['resident_bytes'] / 1024**2:.1f} MiB, "
+            f"{memory_stats['evictions']} evictions ({memory_stats['policy']})"
+        )
+        print(
+            f"  Coalesced in-flight requests: {stats['coalesced_requests']}, "
+            f"{stats['async_coalesced_requests']} async"
+        )
+        policy_stats = stats["endpoint_policy"]
+        print(
+            f"  Endpoint: {policy_stats['retries']} retries, "
+            f"{policy_stats['throttled_responses']} throttled responses, "
+            f"rate {policy_stats['requests_per_second']:.1f} req/s, "
+            f"circuit {policy_stats['circuit_state']}"
+        )
+        return stats
@@ -1,5 +1,8 @@
 from graphviz import Digraph
 import networkx as nx
+from functools import lru_cache
+
+from path_model import EntityGroup
 
 
 def remove_fluff(s):
@@ -11,9 +14,16 @@ def remove_fluff(s):
     )
 
 
+# Bounded: the labels of one graph are reused, older graphs' labels are not.
+@lru_cache(maxsize=4096)
+def _sorted_uris_label(sorted_uris):
+    return ", ".join([remove_fluff(e) for e in sorted_uris])
+
+
 def get_sorted_list_in_str(l):
-    sorted_l = sorted(l)
-    return ", ".join([remove_fluff(e) for e in sorted_l])
+    if isinstance(l, EntityGroup):
+        return _sorted_uris_label(l.sorted_uris())
+    return _sorted_uris_label(tuple(sorted(l)))
 
 
 def multiGraphVizualizationGraphviz(G):